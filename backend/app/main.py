@@ -8,6 +8,7 @@ from .api import api_router
 from .database import create_tables
 from .services.sandbox_poller import run_cape_poller
 from .services.threat_feed_manager import ThreatFeedManager
+from .services.email_authentication import email_auth_service
 
 # Configure structured logging
 structlog.configure(
@@ -74,6 +75,12 @@ async def startup_event():
         raise
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release shared service resources on shutdown."""
+    await email_auth_service.close()
+
+
 @app.get("/health")
 def health():
     return {
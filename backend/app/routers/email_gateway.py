@@ -58,6 +58,7 @@ class EmailGatewayStats(BaseModel):
     emails_quarantined: int
     emails_blocked: int
     processing_time_avg: float
+    queue_size: int = 0
 
 
 @router.post("/process", response_model=EmailProcessingResponse, dependencies=[Depends(verify_request)])
@@ -19,6 +19,7 @@ from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, confusion_matrix
 import joblib
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 logger = structlog.get_logger()
 
@@ -59,6 +60,21 @@ class AIThreatDetection:
         self.retrain_interval = config.get('retrain_interval', 7)  # days
         self.min_training_samples = config.get('min_training_samples', 1000)
         
+        # Model inference runs here so it does not stall the event loop; sklearn
+        # releases the GIL in its heavy kernels, and threads share the loaded models
+        self._inference_pool = ThreadPoolExecutor(
+            max_workers=config.get('inference_workers', os.cpu_count() or 1),
+            thread_name_prefix='ai-inference'
+        )
+        
+        # Single-email predictions are coalesced into one classifier pass; a batch
+        # is flushed when it is full or after a short wait, whichever comes first
+        self.inference_batch_size = config.get('inference_batch_size', 32)
+        self.inference_batch_wait = config.get('inference_batch_wait', 0.005)  # seconds
+        self._inference_queue: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._inference_timer: Optional[asyncio.TimerHandle] = None
+        self._inference_batches: set = set()
+        
         # Feature engineering
         self.email_features = EmailFeatureExtractor()
         self.link_features = LinkFeatureExtractor()
@@ -475,45 +491,60 @@ class AIThreatDetection:
             logger.error("Error training ensemble classifier", error=str(e))
             raise
     
+    def _classify_emails(self, emails: List[Dict[str, Any]]) -> Optional[List[ThreatPrediction]]:
+        """Run the email classifier over a batch; CPU-bound, called on the inference pool"""
+        if 'email_classifier' not in self.models:
+            return None
+        
+        model = self.models['email_classifier']
+        vectorizer = self.vectorizers['email_classifier']
+        
+        # Prepare text for prediction
+        email_texts = [f"{e.get('subject', '')} {e.get('body_text', '')}" for e in emails]
+        X = vectorizer.transform(email_texts)
+        
+        # Get predictions
+        predictions = model.predict(X)
+        confidences = model.predict_proba(X).max(axis=1)
+        
+        prediction_time = datetime.utcnow()
+        model_version = self.current_models['email_classifier']
+        results = []
+        for email_data, prediction, confidence in zip(emails, predictions, confidences):
+            # Extract email features
+            email_features = self.email_features.extract_features(email_data)
+            
+            # Map prediction to threat type
+            threat_type = self._map_prediction_to_threat_type(prediction)
+            
+            results.append(ThreatPrediction(
+                threat_type=threat_type,
+                confidence=confidence,
+                threat_score=self._calculate_threat_score(threat_type, confidence, email_features),
+                indicators=self._extract_threat_indicators(email_data, email_features),
+                model_version=model_version,
+                prediction_time=prediction_time
+            ))
+        
+        return results
+    
     async def predict_email_threat(self, email_data: Dict[str, Any]) -> ThreatPrediction:
         """Predict email threat using AI models"""
         try:
-            # Extract email features
-            email_features = self.email_features.extract_features(email_data)
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._inference_queue.append((email_data, future))
             
-            # Get email classifier prediction
-            if 'email_classifier' in self.models:
-                model = self.models['email_classifier']
-                vectorizer = self.vectorizers['email_classifier']
-                
-                # Prepare text for prediction
-                email_text = f"{email_data.get('subject', '')} {email_data.get('body_text', '')}"
-                X = vectorizer.transform([email_text])
-                
-                # Get prediction
-                prediction = model.predict(X)[0]
-                confidence = model.predict_proba(X).max()
-                
-                # Map prediction to threat type
-                threat_type = self._map_prediction_to_threat_type(prediction)
-                
-                # Calculate threat score
-                threat_score = self._calculate_threat_score(threat_type, confidence, email_features)
-                
-                # Extract indicators
-                indicators = self._extract_threat_indicators(email_data, email_features)
-                
-                return ThreatPrediction(
-                    threat_type=threat_type,
-                    confidence=confidence,
-                    threat_score=threat_score,
-                    indicators=indicators,
-                    model_version=self.current_models['email_classifier'],
-                    prediction_time=datetime.utcnow()
-                )
-            else:
+            if len(self._inference_queue) >= self.inference_batch_size:
+                self._flush_inference_queue()
+            elif self._inference_timer is None:
+                self._inference_timer = loop.call_later(self.inference_batch_wait, self._flush_inference_queue)
+            
+            result = await future
+            if result is None:
                 # Fallback to heuristic analysis
                 return await self._heuristic_email_analysis(email_data)
+            return result
                 
         except Exception as e:
             logger.error("Error predicting email threat", error=str(e))
@@ -526,6 +557,69 @@ class AIThreatDetection:
                 prediction_time=datetime.utcnow()
             )
 
+    def _flush_inference_queue(self):
+        """Hand every queued prediction request to one classifier batch"""
+        if self._inference_timer is not None:
+            self._inference_timer.cancel()
+            self._inference_timer = None
+        
+        batch, self._inference_queue = self._inference_queue, []
+        if batch:
+            task = asyncio.create_task(self._run_inference_batch(batch))
+            self._inference_batches.add(task)
+            task.add_done_callback(self._inference_batches.discard)
+    
+    async def _run_inference_batch(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        """Classify a batch in one pass and resolve each waiter (None means no model loaded)"""
+        try:
+            loop = asyncio.get_running_loop()
+            results = await loop.run_in_executor(
+                self._inference_pool, self._classify_emails, [email_data for email_data, _ in batch]
+            )
+        except Exception as e:
+            if len(batch) > 1:
+                # One bad email shouldn't fail its neighbours: retry singly so
+                # only the email that raised gets the exception
+                await self._run_inference_singly(batch)
+                return
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for index, (_, future) in enumerate(batch):
+            if not future.done():
+                future.set_result(None if results is None else results[index])
+    
+    async def _run_inference_singly(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        """Classify each email of a failed batch on its own, failing only the ones that raise"""
+        loop = asyncio.get_running_loop()
+        for email_data, future in batch:
+            try:
+                results = await loop.run_in_executor(self._inference_pool, self._classify_emails, [email_data])
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            if not future.done():
+                future.set_result(None if results is None else results[0])
+    
+    async def predict_email_threat_batch(self, emails: List[Dict[str, Any]]) -> List[ThreatPrediction]:
+        """Predict threats for several emails with one vectorizer/model pass"""
+        try:
+            if not emails:
+                return []
+            
+            loop = asyncio.get_running_loop()
+            results = await loop.run_in_executor(self._inference_pool, self._classify_emails, emails)
+            if results is None:
+                return list(await asyncio.gather(*(self._heuristic_email_analysis(e) for e in emails)))
+            return results
+        
+        except Exception as e:
+            logger.error("Error predicting email threat batch", error=str(e), batch_size=len(emails))
+            return list(await asyncio.gather(*(self.predict_email_threat(e) for e in emails)))
+    
     async def predict_email_intent(self, email_data: Dict[str, Any]) -> Dict[str, Any]:
         """Lightweight intent classification for Phase 1 labeling.
 
@@ -1038,6 +1132,12 @@ class AIThreatDetection:
         """Cleanup AI threat detection resources"""
         try:
             await self.threat_intel.cleanup()
+            
+            # Let queued predictions finish before the pool goes away
+            self._flush_inference_queue()
+            if self._inference_batches:
+                await asyncio.gather(*self._inference_batches, return_exceptions=True)
+            self._inference_pool.shutdown(wait=False)
             logger.info("AI threat detection system cleaned up")
         except Exception as e:
             logger.error("Error cleaning up AI threat detection system", error=str(e))
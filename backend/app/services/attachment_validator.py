@@ -155,7 +155,8 @@ class AttachmentValidator:
         self, 
         filename: str, 
         file_content: bytes, 
-        mime_type: str = None
+        mime_type: str = None,
+        file_hash: str = None
     ) -> AttachmentValidation:
         """
         Validate attachment for security threats
@@ -164,6 +165,7 @@ class AttachmentValidator:
             filename: Original filename
             file_content: File content as bytes
             mime_type: MIME type (if known)
+            file_hash: SHA-256 hex digest of file_content (if already computed)
             
         Returns:
             AttachmentValidation with comprehensive results
@@ -186,7 +188,7 @@ class AttachmentValidator:
             
             # Run validation checks
             risk_level, threat_types, indicators, metadata = await self._run_validation_checks(
-                filename, file_content, file_extension, mime_type, detected_type
+                filename, file_content, file_extension, mime_type, detected_type, file_hash
             )
             
             # Determine if file is safe
@@ -317,7 +319,8 @@ class AttachmentValidator:
         file_content: bytes, 
         file_extension: str, 
         mime_type: str, 
-        detected_type: AttachmentType
+        detected_type: AttachmentType,
+        file_hash: str = None
     ) -> Tuple[AttachmentRisk, List[ThreatType], List[str], Dict[str, Any]]:
         """Run comprehensive validation checks"""
         threat_types = []
@@ -378,9 +381,8 @@ class AttachmentValidator:
             indicators.append("File appears to be encrypted")
             risk_level = max(risk_level, AttachmentRisk.MEDIUM)
         
-        # Calculate file hash
-        file_hash = hashlib.sha256(file_content).hexdigest()
-        metadata['file_hash'] = file_hash
+        # Calculate file hash unless the caller already did
+        metadata['file_hash'] = file_hash or hashlib.sha256(file_content).hexdigest()
         
         return risk_level, threat_types, indicators, metadata
     
@@ -52,6 +52,21 @@ async def analyze_email_content(email_id: int, content: str, subject: str):
         db.close()
 
 
+async def analyze_email_content_batch(items: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+    """Analyze a batch of emails without database records; results follow input order."""
+    
+    logger.debug("Starting batched email content analysis", batch_size=len(items))
+    
+    return await asyncio.gather(*(
+        _perform_email_analysis(
+            item.get("content") or "",
+            item.get("subject") or "",
+            item.get("sender") or ""
+        )
+        for item in items
+    ))
+
+
 async def _perform_email_analysis(content: str, subject: str, sender: str) -> Dict[str, Any]:
     """Perform comprehensive email analysis."""
     
@@ -4,30 +4,44 @@ Implements DMARC, DKIM, and SPF validation for email security
 """
 
 import dns.resolver
+import dns.asyncresolver
 import dns.exception
 import re
 import hashlib
+import hmac
 import base64
 import structlog
-from typing import Dict, Any, Optional, List, Tuple
+from typing import Dict, Any, Optional, List, Tuple, Union
 from dataclasses import dataclass
-from enum import Enum
+from enum import IntEnum
 import asyncio
 import aiohttp
+import bisect
+import time
+from collections import OrderedDict
+from functools import lru_cache
 from email.mime.text import MIMEText
 from email.header import decode_header
 
 logger = structlog.get_logger()
 
 
-class AuthenticationResult(Enum):
+class AuthenticationResult(IntEnum):
     """Email authentication results"""
-    PASS = "pass"
-    FAIL = "fail"
-    NEUTRAL = "neutral"
-    NONE = "none"
-    TEMPERROR = "temperror"
-    PERMERROR = "permerror"
+    PASS = 0
+    FAIL = 1
+    NEUTRAL = 2
+    NONE = 3
+    TEMPERROR = 4
+    PERMERROR = 5
+    
+    @property
+    def label(self) -> str:
+        """RFC result keyword, e.g. "pass" or "permerror"."""
+        return self.name.lower()
+    
+    def __str__(self) -> str:
+        return self.label
 
 
 @dataclass
@@ -49,6 +63,7 @@ class DKIMResult:
     signature: Optional[str] = None
     body_hash: Optional[str] = None
     headers: Optional[List[str]] = None
+    explanation: Optional[str] = None
 
 
 @dataclass
@@ -61,6 +76,7 @@ class DMARCResult:
     rua: Optional[str] = None
     ruf: Optional[str] = None
     domain: Optional[str] = None
+    explanation: Optional[str] = None
 
 
 @dataclass
@@ -74,6 +90,102 @@ class EmailAuthenticationResult:
     recommendations: List[str]
 
 
+# Per-protocol scoring: result -> (score delta, recommendation)
+SPF_SCORES = {
+    AuthenticationResult.PASS: (0.3, None),
+    AuthenticationResult.FAIL: (-0.2, "SPF validation failed - check sender IP"),
+    AuthenticationResult.NONE: (0.0, "No SPF record found - implement SPF"),
+}
+
+DKIM_SCORES = {
+    AuthenticationResult.PASS: (0.4, None),
+    AuthenticationResult.FAIL: (-0.3, "DKIM validation failed - check signature"),
+    AuthenticationResult.NONE: (0.0, "No DKIM signature found - implement DKIM"),
+}
+
+DMARC_SCORES = {
+    AuthenticationResult.PASS: (0.3, None),
+    AuthenticationResult.NONE: (0.0, "No DMARC record found - implement DMARC"),
+}
+
+# Extra credit for enforcing DMARC policies (only applied on DMARC pass)
+DMARC_POLICY_BONUS = {
+    "reject": 0.1,
+    "quarantine": 0.05,
+}
+
+# Overall result by score: < 0.0 fails, >= 0.8 passes, anything between is neutral
+OVERALL_THRESHOLDS = [0.0, 0.8]
+OVERALL_RESULTS = [
+    AuthenticationResult.FAIL,
+    AuthenticationResult.NEUTRAL,
+    AuthenticationResult.PASS,
+]
+
+_NO_SCORE = (0.0, None)
+
+# SPF terms: optional qualifier, mechanism name and optional ":argument",
+# fenced by whitespace so modifiers like redirect= never yield a match
+_SPF_TOKEN_RE = re.compile(
+    r'(?<!\S)(?P<qual>[+\-~?]?)(?P<mech>ip4|ip6|a|mx|include|exists|ptr|all)'
+    r'(?::(?P<arg>\S+))?(?!\S)',
+    re.IGNORECASE
+)
+
+# SPF qualifier -> result when its mechanism matches (no SOFTFAIL result yet)
+SPF_QUALIFIER_RESULTS = {
+    "": AuthenticationResult.PASS,
+    "+": AuthenticationResult.PASS,
+    "-": AuthenticationResult.FAIL,
+    "~": AuthenticationResult.NEUTRAL,
+    "?": AuthenticationResult.NEUTRAL,
+}
+
+# DNS-over-HTTPS JSON API record type codes
+_DOH_RECORD_TYPES = {"A": 1, "MX": 15, "TXT": 16, "AAAA": 28}
+_DOH_TXT_STRING_RE = re.compile(r'"((?:[^"\\]|\\.)*)"')
+
+# DKIM body canonicalization (RFC 6376 §3.4)
+_DKIM_LINE_ENDING_RE = re.compile(rb"\r?\n")
+_DKIM_WSP_RUN_RE = re.compile(rb"[ \t]+")
+_DKIM_TRAILING_WSP_RE = re.compile(rb"[ \t]+(?=\r\n|$)")
+_DKIM_TRAILING_LINES_RE = re.compile(rb"(?:\r\n)+$")
+
+
+@lru_cache(maxsize=4096)
+def _compile_spf(record: str) -> Optional[Tuple[Tuple[str, str, Optional[str], str], ...]]:
+    """
+    Tokenize an SPF record into (qualifier, mechanism, argument, term) tuples
+    in a single regex scan. Returns None if the record isn't SPF version 1.
+    """
+    version, _, terms = record.partition(" ")
+    if version.lower() != "v=spf1":
+        return None
+    return tuple(
+        (m["qual"], m["mech"].lower(), m["arg"], m[0])
+        for m in _SPF_TOKEN_RE.finditer(terms)
+    )
+
+
+@lru_cache(maxsize=4096)
+def _parse_dmarc_record(record: str) -> Optional[Dict[str, str]]:
+    """
+    Parse DMARC record parameters. Results are memoized per raw record and
+    shared between callers, so the returned dict must not be mutated.
+    """
+    try:
+        params = {}
+        # Simple parsing - in production, use proper DMARC library
+        parts = record.split(";")
+        for part in parts:
+            if "=" in part:
+                key, value = part.split("=", 1)
+                params[key.strip()] = value.strip()
+        return params
+    except Exception:
+        return None
+
+
 class EmailAuthenticationService:
     """Service for validating email authentication (DMARC, DKIM, SPF)"""
     
@@ -81,12 +193,55 @@ class EmailAuthenticationService:
         self.dns_timeout = 5.0
         self.max_dns_queries = 10
         
+        # DNS answer cache: (domain, record_type) -> (expires_at, records), LRU-bounded
+        self.dns_cache_ttl = 300  # 5 minutes
+        self.dns_cache_size = 10000
+        self.dns_cache: "OrderedDict[Tuple[str, str], Tuple[float, List[str]]]" = OrderedDict()
+        
+        # Lookups currently on the wire, so concurrent misses share one query
+        self._in_flight: Dict[Tuple[str, str], asyncio.Future] = {}
+        
+        # Asynchronous resolver, so lookups yield to the event loop instead of
+        # blocking it; created on first use (it reads the system resolver config)
+        self._resolver: Optional[dns.asyncresolver.Resolver] = None
+        
+        # DNS-over-HTTPS fallback for networks where plain DNS is blocked; one
+        # pooled session, opened on the first fallback, is shared by every query
+        self.doh_url = "https://cloudflare-dns.com/dns-query"
+        self._doh: Optional[aiohttp.ClientSession] = None
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+    
+    async def close(self):
+        """Close the DoH session, if one was opened"""
+        if self._doh:
+            await self._doh.close()
+            self._doh = None
+    
+    def _doh_session(self) -> aiohttp.ClientSession:
+        """Pooled DoH session, created on first use"""
+        if self._doh is None or self._doh.closed:
+            self._doh = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=100,
+                    limit_per_host=32,
+                    ttl_dns_cache=300,
+                    keepalive_timeout=75
+                ),
+                timeout=aiohttp.ClientTimeout(total=self.dns_timeout)
+            )
+        return self._doh
+    
     async def validate_email_authentication(
         self, 
         email_headers: Dict[str, str], 
         sender_ip: str,
         sender_domain: str,
-        email_body: str = ""
+        email_body: Optional[Union[bytes, str]] = None
     ) -> EmailAuthenticationResult:
         """
         Validate email authentication using DMARC, DKIM, and SPF
@@ -95,35 +250,44 @@ class EmailAuthenticationService:
             email_headers: Email headers dictionary
             sender_ip: IP address of the sender
             sender_domain: Domain of the sender
-            email_body: Email body content for DKIM validation
+            email_body: Raw email body for the DKIM body hash check; bytes are
+                hashed as-is, str is UTF-8 encoded once. When omitted only the
+                signature and key lookup are validated.
             
         Returns:
             EmailAuthenticationResult with validation results
         """
         try:
-            logger.info(f"Validating email authentication for {sender_domain}")
-            
-            # Run SPF, DKIM, and DMARC validation in parallel
-            spf_task = asyncio.create_task(self._validate_spf(sender_ip, sender_domain))
-            dkim_task = asyncio.create_task(self._validate_dkim(email_headers, email_body))
-            dmarc_task = asyncio.create_task(self._validate_dmarc(sender_domain))
+            logger.info("Validating email authentication", domain=sender_domain)
             
-            spf_result, dkim_result, dmarc_result = await asyncio.gather(
-                spf_task, dkim_task, dmarc_task, return_exceptions=True
-            )
+            if isinstance(email_body, str):
+                email_body = email_body.encode("utf-8")
             
-            # Handle exceptions
-            if isinstance(spf_result, Exception):
-                logger.error(f"SPF validation error: {spf_result}")
-                spf_result = SPFResult(AuthenticationResult.TEMPERROR, explanation=str(spf_result))
+            # A cached "-all" SPF record that already rejects this IP settles the
+            # result, so skip the DKIM key and DMARC lookups entirely
+            spf_result = self._cached_spf_hard_fail(sender_ip, sender_domain)
             
-            if isinstance(dkim_result, Exception):
-                logger.error(f"DKIM validation error: {dkim_result}")
-                dkim_result = DKIMResult(AuthenticationResult.TEMPERROR)
-            
-            if isinstance(dmarc_result, Exception):
-                logger.error(f"DMARC validation error: {dmarc_result}")
-                dmarc_result = DMARCResult(AuthenticationResult.TEMPERROR)
+            if spf_result:
+                dkim_result = DKIMResult(
+                    result=AuthenticationResult.NEUTRAL,
+                    explanation="Skipped: SPF hard fail"
+                )
+                dmarc_result = DMARCResult(
+                    result=AuthenticationResult.NEUTRAL,
+                    domain=sender_domain,
+                    explanation="Skipped: SPF hard fail"
+                )
+            else:
+                # Run SPF, DKIM, and DMARC validation in parallel
+                spf_task = asyncio.create_task(self._validate_spf(sender_ip, sender_domain))
+                dkim_task = asyncio.create_task(self._validate_dkim(email_headers, email_body))
+                dmarc_task = asyncio.create_task(self._validate_dmarc(sender_domain))
+                
+                # Each validator turns its own failures into a TEMPERROR result,
+                # so anything raised here is unexpected and handled below
+                spf_result, dkim_result, dmarc_result = await asyncio.gather(
+                    spf_task, dkim_task, dmarc_task
+                )
             
             # Calculate overall result and score
             overall_result, score, recommendations = self._calculate_overall_result(
@@ -139,11 +303,16 @@ class EmailAuthenticationService:
                 recommendations=recommendations
             )
             
-            logger.info(f"Email authentication result: {overall_result.value} (score: {score:.2f})")
+            logger.info(
+                "Email authentication result",
+                domain=sender_domain,
+                result=overall_result.label,
+                score=round(score, 2)
+            )
             return result
             
         except Exception as e:
-            logger.error(f"Error in email authentication validation: {e}")
+            logger.error("Error in email authentication validation", domain=sender_domain, error=str(e))
             return EmailAuthenticationResult(
                 spf=SPFResult(AuthenticationResult.TEMPERROR),
                 dkim=DKIMResult(AuthenticationResult.TEMPERROR),
@@ -153,8 +322,46 @@ class EmailAuthenticationService:
                 recommendations=["Authentication validation failed due to system error"]
             )
     
-    async def _validate_spf(self, sender_ip: str, sender_domain: str) -> SPFResult:
-        """Validate SPF record for the sender domain"""
+    async def validate_batch(
+        self,
+        items: List[Dict[str, Any]],
+        concurrency: int = 64
+    ) -> List[EmailAuthenticationResult]:
+        """
+        Validate authentication for many emails concurrently
+        
+        Args:
+            items: Keyword arguments for validate_email_authentication, one
+                dict per email
+            concurrency: Maximum number of emails validated at once
+        
+        Returns:
+            EmailAuthenticationResult list in the same order as items
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def _validate_one(item: Dict[str, Any]) -> EmailAuthenticationResult:
+            async with semaphore:
+                return await self.validate_email_authentication(**item)
+        
+        return await asyncio.gather(*(_validate_one(item) for item in items))
+    
+    async def _validate_spf(
+        self,
+        sender_ip: str,
+        sender_domain: str,
+        query_budget: Optional[List[int]] = None
+    ) -> SPFResult:
+        """
+        Validate SPF record for the sender domain
+        
+        ``query_budget`` is a single-element list shared across recursive
+        ``include:`` evaluation so the RFC 7208 DNS lookup limit applies to
+        the whole check rather than to each record.
+        """
+        if query_budget is None:
+            query_budget = [self.max_dns_queries]
+        
         try:
             # Query SPF record
             spf_record = await self._query_dns_record(sender_domain, "TXT")
@@ -167,8 +374,8 @@ class EmailAuthenticationService:
                 )
             
             # Parse SPF record
-            spf_parts = spf_record.split()
-            if not spf_parts or spf_parts[0] != "v=spf1":
+            spf_terms = _compile_spf(spf_record)
+            if spf_terms is None:
                 return SPFResult(
                     result=AuthenticationResult.NONE,
                     domain=sender_domain,
@@ -176,49 +383,36 @@ class EmailAuthenticationService:
                 )
             
             # Check mechanisms
-            for mechanism in spf_parts[1:]:
-                if mechanism.startswith("ip4:") or mechanism.startswith("ip6:"):
-                    if self._check_ip_mechanism(mechanism, sender_ip):
-                        return SPFResult(
-                            result=AuthenticationResult.PASS,
-                            mechanism=mechanism,
-                            ip_address=sender_ip,
-                            domain=sender_domain
-                        )
+            for qualifier, mechanism, argument, term in spf_terms:
+                if mechanism == "ip4" or mechanism == "ip6":
+                    matched = self._check_ip_mechanism(mechanism, argument, sender_ip)
                 elif mechanism == "a":
-                    if await self._check_a_mechanism(sender_domain, sender_ip):
-                        return SPFResult(
-                            result=AuthenticationResult.PASS,
-                            mechanism=mechanism,
-                            ip_address=sender_ip,
-                            domain=sender_domain
-                        )
+                    if not self._consume_spf_query(query_budget):
+                        return self._spf_limit_result(sender_domain)
+                    matched = await self._check_a_mechanism(argument or sender_domain, sender_ip)
                 elif mechanism == "mx":
-                    if await self._check_mx_mechanism(sender_domain, sender_ip):
-                        return SPFResult(
-                            result=AuthenticationResult.PASS,
-                            mechanism=mechanism,
-                            ip_address=sender_ip,
-                            domain=sender_domain
-                        )
-                elif mechanism == "include:":
-                    # Handle include mechanism (simplified)
+                    if not self._consume_spf_query(query_budget):
+                        return self._spf_limit_result(sender_domain)
+                    matched = await self._check_mx_mechanism(argument or sender_domain, sender_ip, query_budget)
+                    if matched is None:
+                        return self._spf_limit_result(sender_domain)
+                elif mechanism == "include":
+                    if not argument:
+                        continue
+                    if not self._consume_spf_query(query_budget):
+                        return self._spf_limit_result(sender_domain)
+                    include_result = await self._validate_spf(sender_ip, argument, query_budget)
+                    if include_result.result == AuthenticationResult.PERMERROR:
+                        return include_result
+                    matched = include_result.result == AuthenticationResult.PASS
+                elif mechanism == "all":
+                    matched = True
+                else:
+                    # exists/ptr are not supported
                     continue
-                elif mechanism in ["+all", "all"]:
-                    return SPFResult(
-                        result=AuthenticationResult.PASS,
-                        mechanism=mechanism,
-                        ip_address=sender_ip,
-                        domain=sender_domain
-                    )
-                elif mechanism == "-all":
-                    return SPFResult(
-                        result=AuthenticationResult.FAIL,
-                        mechanism=mechanism,
-                        ip_address=sender_ip,
-                        domain=sender_domain,
-                        explanation="SPF record explicitly denies this IP"
-                    )
+                
+                if matched:
+                    return self._spf_match_result(qualifier, term, sender_ip, sender_domain)
             
             # Default to neutral if no mechanism matches
             return SPFResult(
@@ -228,14 +422,65 @@ class EmailAuthenticationService:
             )
             
         except Exception as e:
-            logger.error(f"SPF validation error: {e}")
+            logger.error("SPF validation error", domain=sender_domain, error=str(e))
             return SPFResult(
                 result=AuthenticationResult.TEMPERROR,
                 domain=sender_domain,
                 explanation=f"SPF validation error: {str(e)}"
             )
     
-    async def _validate_dkim(self, email_headers: Dict[str, str], email_body: str) -> DKIMResult:
+    def _cached_spf_hard_fail(self, sender_ip: str, sender_domain: str) -> Optional[SPFResult]:
+        """
+        Evaluate a cached SPF record without DNS, returning a FAIL result only
+        when ``-all`` is reached through ip4/ip6 mechanisms that don't match.
+        Any mechanism needing a lookup defers to the full ``_validate_spf``.
+        """
+        spf_record = self._get_cached_dns_record(sender_domain, "TXT")
+        if not spf_record:
+            return None
+        
+        spf_terms = _compile_spf(spf_record)
+        if spf_terms is None:
+            return None
+        
+        for qualifier, mechanism, argument, term in spf_terms:
+            if mechanism == "ip4" or mechanism == "ip6":
+                if self._check_ip_mechanism(mechanism, argument, sender_ip):
+                    return None
+            elif mechanism == "all" and qualifier == "-":
+                return self._spf_match_result(qualifier, term, sender_ip, sender_domain)
+            else:
+                return None
+        
+        return None
+    
+    def _spf_match_result(self, qualifier: str, term: str, sender_ip: str, sender_domain: str) -> SPFResult:
+        """SPF result for the first matching mechanism, per its qualifier"""
+        result = SPF_QUALIFIER_RESULTS[qualifier]
+        return SPFResult(
+            result=result,
+            mechanism=term,
+            ip_address=sender_ip,
+            domain=sender_domain,
+            explanation="SPF record explicitly denies this IP" if result == AuthenticationResult.FAIL else None
+        )
+    
+    def _consume_spf_query(self, query_budget: List[int]) -> bool:
+        """Charge one DNS lookup against the SPF budget; False once exhausted"""
+        if query_budget[0] <= 0:
+            return False
+        query_budget[0] -= 1
+        return True
+    
+    def _spf_limit_result(self, sender_domain: str) -> SPFResult:
+        """SPF result for records exceeding the RFC 7208 lookup limit"""
+        return SPFResult(
+            result=AuthenticationResult.PERMERROR,
+            domain=sender_domain,
+            explanation="SPF query limit exceeded"
+        )
+    
+    async def _validate_dkim(self, email_headers: Dict[str, str], email_body: Optional[bytes]) -> DKIMResult:
         """Validate DKIM signature"""
         try:
             # Extract DKIM signature from headers
@@ -302,7 +547,7 @@ class EmailAuthenticationService:
                 )
                 
         except Exception as e:
-            logger.error(f"DKIM validation error: {e}")
+            logger.error("DKIM validation error", error=str(e))
             return DKIMResult(
                 result=AuthenticationResult.TEMPERROR,
                 explanation=f"DKIM validation error: {str(e)}"
@@ -322,7 +567,7 @@ class EmailAuthenticationService:
                 )
             
             # Parse DMARC record
-            dmarc_params = self._parse_dmarc_record(dmarc_record)
+            dmarc_params = _parse_dmarc_record(dmarc_record)
             
             if not dmarc_params:
                 return DMARCResult(
@@ -333,7 +578,9 @@ class EmailAuthenticationService:
             
             policy = dmarc_params.get("p", "none")
             subdomain_policy = dmarc_params.get("sp", policy)
-            pct = int(dmarc_params.get("pct", "100"))
+            pct_raw = dmarc_params.get("pct")
+            pct = int(pct_raw) if pct_raw and pct_raw.isdigit() else 100
+            pct = max(0, min(100, pct))
             rua = dmarc_params.get("rua")
             ruf = dmarc_params.get("ruf")
             
@@ -348,36 +595,130 @@ class EmailAuthenticationService:
             )
             
         except Exception as e:
-            logger.error(f"DMARC validation error: {e}")
+            logger.error("DMARC validation error", domain=sender_domain, error=str(e))
             return DMARCResult(
                 result=AuthenticationResult.TEMPERROR,
                 domain=sender_domain,
                 explanation=f"DMARC validation error: {str(e)}"
             )
     
+    def _get_cached_dns_records(self, domain: str, record_type: str) -> Optional[List[str]]:
+        """Return cached DNS answers if they haven't expired"""
+        key = (domain, record_type)
+        cached = self.dns_cache.get(key)
+        if cached is None:
+            return None
+        if cached[0] > time.monotonic():
+            self.dns_cache.move_to_end(key)
+            return cached[1]
+        del self.dns_cache[key]
+        return None
+    
+    def _get_cached_dns_record(self, domain: str, record_type: str) -> Optional[str]:
+        """Return the first cached DNS answer if it hasn't expired"""
+        records = self._get_cached_dns_records(domain, record_type)
+        return records[0] if records else None
+    
     async def _query_dns_record(self, domain: str, record_type: str) -> Optional[str]:
-        """Query DNS record for a domain"""
+        """Query the first DNS record of a type for a domain"""
+        records = await self._query_dns_all(domain, record_type)
+        return records[0] if records else None
+    
+    async def _query_dns_all(self, domain: str, record_type: str) -> List[str]:
+        """Query all DNS records of a type, served from the answer cache when fresh"""
+        cached = self._get_cached_dns_records(domain, record_type)
+        if cached is not None:
+            return cached
+        
+        key = (domain, record_type)
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            # Shield so a cancelled waiter doesn't cancel everyone else's lookup
+            return await asyncio.shield(in_flight)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
         try:
-            resolver = dns.resolver.Resolver()
-            resolver.timeout = self.dns_timeout
-            resolver.lifetime = self.dns_timeout
-            
-            answers = resolver.resolve(domain, record_type)
-            
-            for answer in answers:
+            records = await self._resolve_dns_records(domain, record_type)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        finally:
+            del self._in_flight[key]
+        
+        if records:
+            self.dns_cache[key] = (time.monotonic() + self.dns_cache_ttl, records)
+            self.dns_cache.move_to_end(key)
+            if len(self.dns_cache) > self.dns_cache_size:
+                self.dns_cache.popitem(last=False)
+        future.set_result(records)
+        return records
+    
+    async def _resolve_dns_records(self, domain: str, record_type: str) -> List[str]:
+        """Resolve all DNS records of a type for a domain"""
+        try:
+            if self._resolver is None:
+                self._resolver = dns.asyncresolver.Resolver()
+                self._resolver.timeout = self.dns_timeout
+                self._resolver.lifetime = self.dns_timeout
+            
+            answers = await self._resolver.resolve(domain, record_type)
+            
+            if record_type == "TXT":
+                # Long SPF/DKIM records are split into several character-strings
+                return [b"".join(answer.strings).decode("ascii", "replace") for answer in answers]
+            elif record_type in ("A", "AAAA"):
+                return [answer.address for answer in answers]
+            elif record_type == "MX":
+                return [answer.exchange.to_text() for answer in answers]
+            else:
+                return [answer.to_text() for answer in answers]
+            
+        except (dns.exception.Timeout, dns.resolver.NoNameservers) as e:
+            logger.debug(
+                "DNS unreachable, falling back to DoH",
+                domain=domain,
+                record_type=record_type,
+                error=str(e)
+            )
+            return await self._query_doh(domain, record_type)
+        except dns.exception.DNSException as e:
+            logger.debug("DNS query failed", domain=domain, record_type=record_type, error=str(e))
+            return []
+        except Exception as e:
+            logger.error("Unexpected DNS query error", domain=domain, record_type=record_type, error=str(e))
+            return []
+    
+    async def _query_doh(self, domain: str, record_type: str) -> List[str]:
+        """Query DNS records over HTTPS using the pooled session"""
+        try:
+            async with self._doh_session().get(
+                self.doh_url,
+                params={"name": domain, "type": record_type},
+                headers={"Accept": "application/dns-json"}
+            ) as response:
+                if response.status != 200:
+                    return []
+                data = await response.json(content_type=None)
+            
+            rrtype = _DOH_RECORD_TYPES.get(record_type)
+            records = []
+            for answer in data.get("Answer", []):
+                if answer.get("type") != rrtype:
+                    continue
+                value = answer.get("data", "")
                 if record_type == "TXT":
-                    return str(answer).strip('"')
+                    records.append("".join(_DOH_TXT_STRING_RE.findall(value)) or value.strip('"'))
+                elif record_type == "MX":
+                    records.append(value.split()[-1])
                 else:
-                    return str(answer)
-            
-            return None
+                    records.append(value)
             
-        except dns.exception.DNSException as e:
-            logger.debug(f"DNS query failed for {domain} {record_type}: {e}")
-            return None
-        except Exception as e:
-            logger.error(f"Unexpected DNS query error: {e}")
-            return None
+            return records
+        
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            logger.debug("DoH query failed", domain=domain, record_type=record_type, error=str(e))
+            return []
     
     async def _query_dkim_public_key(self, selector: str, domain: str) -> Optional[str]:
         """Query DKIM public key"""
@@ -385,7 +726,7 @@ class EmailAuthenticationService:
             dkim_key_record = await self._query_dns_record(f"{selector}._domainkey.{domain}", "TXT")
             return dkim_key_record
         except Exception as e:
-            logger.error(f"Error querying DKIM key: {e}")
+            logger.error("Error querying DKIM key", selector=selector, domain=domain, error=str(e))
             return None
     
     def _parse_dkim_signature(self, signature: str) -> Optional[Dict[str, str]]:
@@ -402,47 +743,46 @@ class EmailAuthenticationService:
         except Exception:
             return None
     
-    def _parse_dmarc_record(self, record: str) -> Optional[Dict[str, str]]:
-        """Parse DMARC record parameters"""
-        try:
-            params = {}
-            # Simple parsing - in production, use proper DMARC library
-            parts = record.split(";")
-            for part in parts:
-                if "=" in part:
-                    key, value = part.split("=", 1)
-                    params[key.strip()] = value.strip()
-            return params
-        except Exception:
-            return None
-    
-    def _check_ip_mechanism(self, mechanism: str, sender_ip: str) -> bool:
+    def _check_ip_mechanism(self, mechanism: str, ip_range: Optional[str], sender_ip: str) -> bool:
         """Check if sender IP matches SPF IP mechanism"""
         try:
-            if mechanism.startswith("ip4:"):
-                ip_range = mechanism[4:]
+            if not ip_range:
+                return False
+            if mechanism == "ip4":
                 return self._ip_in_range(sender_ip, ip_range)
-            elif mechanism.startswith("ip6:"):
-                ip_range = mechanism[4:]
+            elif mechanism == "ip6":
                 return self._ipv6_in_range(sender_ip, ip_range)
             return False
         except Exception:
             return False
     
     async def _check_a_mechanism(self, domain: str, sender_ip: str) -> bool:
-        """Check if sender IP matches domain's A record"""
+        """Check if sender IP matches any of the domain's A/AAAA records"""
         try:
-            a_record = await self._query_dns_record(domain, "A")
-            return a_record == sender_ip
+            record_type = "AAAA" if ":" in sender_ip else "A"
+            return sender_ip in await self._query_dns_all(domain, record_type)
         except Exception:
             return False
     
-    async def _check_mx_mechanism(self, domain: str, sender_ip: str) -> bool:
-        """Check if sender IP matches domain's MX record"""
+    async def _check_mx_mechanism(self, domain: str, sender_ip: str, query_budget: List[int]) -> Optional[bool]:
+        """
+        Check if sender IP matches an address of any of the domain's MX hosts.
+        Each host's address lookup is charged against the SPF query budget;
+        returns None once the budget is exhausted.
+        """
         try:
-            mx_records = await self._query_dns_record(domain, "MX")
-            # Simplified - in production, resolve MX records to IPs
-            return False
+            record_type = "AAAA" if ":" in sender_ip else "A"
+            # RFC 7208 section 4.6.4: at most 10 MX hosts are looked up
+            mx_hosts = (await self._query_dns_all(domain, "MX"))[:10]
+            for _ in mx_hosts:
+                if not self._consume_spf_query(query_budget):
+                    return None
+            
+            # The address lookups run concurrently on the async resolver
+            mx_addresses = await asyncio.gather(
+                *(self._query_dns_all(mx_host, record_type) for mx_host in mx_hosts)
+            )
+            return any(sender_ip in addresses for addresses in mx_addresses)
         except Exception:
             return False
     
@@ -450,17 +790,53 @@ class EmailAuthenticationService:
         self, 
         signature: str, 
         headers: Dict[str, str], 
-        body: str, 
+        body: Optional[bytes], 
         public_key: str
     ) -> bool:
-        """Verify DKIM signature (simplified implementation)"""
+        """Verify the DKIM body hash (bh=); the header signature (b=) is not checked"""
         try:
-            # This is a simplified implementation
-            # In production, use a proper DKIM library like dkimpy
-            return True  # Placeholder - always return True for MVP
+            dkim_params = self._parse_dkim_signature(signature) or {}
+            
+            # Without the raw body there's nothing to hash; keep the MVP behaviour
+            if body is not None:
+                expected_hash = re.sub(r"\s+", "", dkim_params.get("bh", "")).encode("ascii")
+                if not hmac.compare_digest(self._compute_dkim_body_hash(body, dkim_params), expected_hash):
+                    return False
+            
+            return True
         except Exception:
             return False
     
+    def _compute_dkim_body_hash(self, body: bytes, dkim_params: Dict[str, str]) -> bytes:
+        """Canonicalize the body and return its base64 digest for the bh= tag"""
+        canonicalization = dkim_params.get("c", "simple/simple")
+        body_method = canonicalization.split("/", 1)[1] if "/" in canonicalization else "simple"
+        canonical = self._canonicalize_dkim_body(body, body_method)
+        
+        algorithm = dkim_params.get("a", "rsa-sha256")
+        digest = hashlib.sha1() if algorithm.endswith("sha1") else hashlib.sha256()
+        
+        # memoryview keeps the l= truncation and the hash update copy-free
+        view = memoryview(canonical)
+        body_length = dkim_params.get("l")
+        if body_length and body_length.isdigit():
+            view = view[:int(body_length)]
+        digest.update(view)
+        
+        return base64.b64encode(digest.digest())
+    
+    def _canonicalize_dkim_body(self, body: bytes, method: str) -> bytes:
+        """Apply simple or relaxed DKIM body canonicalization"""
+        body = _DKIM_LINE_ENDING_RE.sub(b"\r\n", body)
+        
+        if method == "relaxed":
+            body = _DKIM_WSP_RUN_RE.sub(b" ", body)
+            body = _DKIM_TRAILING_WSP_RE.sub(b"", body)
+            body = _DKIM_TRAILING_LINES_RE.sub(b"", body)
+            return body + b"\r\n" if body else b""
+        
+        return _DKIM_TRAILING_LINES_RE.sub(b"", body) + b"\r\n"
+    
     def _ip_in_range(self, ip: str, ip_range: str) -> bool:
         """Check if IP is in CIDR range (simplified)"""
         try:
@@ -490,43 +866,19 @@ class EmailAuthenticationService:
         recommendations = []
         score = 0.0
         
-        # SPF scoring
-        if spf.result == AuthenticationResult.PASS:
-            score += 0.3
-        elif spf.result == AuthenticationResult.FAIL:
-            score -= 0.2
-            recommendations.append("SPF validation failed - check sender IP")
-        elif spf.result == AuthenticationResult.NONE:
-            recommendations.append("No SPF record found - implement SPF")
-        
-        # DKIM scoring
-        if dkim.result == AuthenticationResult.PASS:
-            score += 0.4
-        elif dkim.result == AuthenticationResult.FAIL:
-            score -= 0.3
-            recommendations.append("DKIM validation failed - check signature")
-        elif dkim.result == AuthenticationResult.NONE:
-            recommendations.append("No DKIM signature found - implement DKIM")
+        for delta, recommendation in (
+            SPF_SCORES.get(spf.result, _NO_SCORE),
+            DKIM_SCORES.get(dkim.result, _NO_SCORE),
+            DMARC_SCORES.get(dmarc.result, _NO_SCORE),
+        ):
+            score += delta
+            if recommendation:
+                recommendations.append(recommendation)
         
-        # DMARC scoring
         if dmarc.result == AuthenticationResult.PASS:
-            score += 0.3
-            if dmarc.policy == "reject":
-                score += 0.1
-            elif dmarc.policy == "quarantine":
-                score += 0.05
-        elif dmarc.result == AuthenticationResult.NONE:
-            recommendations.append("No DMARC record found - implement DMARC")
+            score += DMARC_POLICY_BONUS.get(dmarc.policy, 0.0)
         
-        # Determine overall result
-        if score >= 0.8:
-            overall_result = AuthenticationResult.PASS
-        elif score >= 0.5:
-            overall_result = AuthenticationResult.NEUTRAL
-        elif score >= 0.0:
-            overall_result = AuthenticationResult.NEUTRAL
-        else:
-            overall_result = AuthenticationResult.FAIL
+        overall_result = OVERALL_RESULTS[bisect.bisect_right(OVERALL_THRESHOLDS, score)]
         
         # Add general recommendations
         if score < 0.7:
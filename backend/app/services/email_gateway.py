@@ -4,27 +4,173 @@ Implements email routing, link rewriting, and attachment processing
 """
 
 import asyncio
+import json
+import os
 import smtplib
 import email
 import re
+import sys
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
-from typing import Dict, Any, List, Optional, Tuple
-from datetime import datetime
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple, Callable, Awaitable
+from datetime import datetime, timedelta, timezone
 import structlog
+import redis.asyncio as redis
 from urllib.parse import urlparse, quote_plus
 import hashlib
-import uuid
+import html
 
 from ..core.config import get_settings
 from .real_time_sandbox import RealTimeSandbox
-from .email_analyzer import analyze_email_content
+from .email_analyzer import analyze_email_content_batch
 
 logger = structlog.get_logger()
 settings = get_settings()
 
+# URL pattern used for link extraction, compiled once per process. A single
+# character class of RFC 3986 URI characters keeps matching to one bitmap test
+# per character.
+_URL_RE = re.compile(r"\bhttps?://[\w\-._~:/?#\[\]@!$&'()*+,;=%]+", re.ASCII)
+
+# href attribute values in HTML bodies. <script>/<style> blocks are matched
+# first so anything URL-shaped inside them is passed through untouched.
+_HTML_HREF_RE = re.compile(
+    r"""(<(script|style)\b.*?</\2\s*>)|((?<![\w-])href\s*=\s*)(["'])(.*?)\4""",
+    re.IGNORECASE | re.DOTALL
+)
+
+# Privik header names, interned once so every processed email shares the same
+# key objects and downstream header lookups hit the identity fast path
+_HEADER_SECURITY = sys.intern('X-Privik-Security')
+_HEADER_THREAT_SCORE = sys.intern('X-Privik-Threat-Score')
+_HEADER_AI_VERDICT = sys.intern('X-Privik-AI-Verdict')
+_HEADER_POLICY = sys.intern('X-Privik-Policy')
+_HEADER_PROCESSED = sys.intern('X-Privik-Processed')
+_HEADER_WARNING = sys.intern('X-Privik-Warning')
+
+
+@lru_cache(maxsize=4096)
+def _url_netloc(url: str) -> str:
+    """Lower-cased netloc of a URL; repeated links skip the urlparse call"""
+    return urlparse(url).netloc.lower()
+
+
+def _splice_links(body: str, link_spans: List[Tuple[int, int, str]],
+                  replace: Callable[[str], Optional[str]]) -> str:
+    """Rebuild body with each located URL swapped for replace(url), unless that is None"""
+    parts = []
+    last = 0
+    for start, end, url in link_spans:
+        replacement = replace(url)
+        if replacement is None:
+            continue
+        parts.append(body[last:start])
+        parts.append(replacement)
+        last = end
+    parts.append(body[last:])
+    return ''.join(parts)
+
+
+def _new_tracking_ids(count: int) -> List[str]:
+    """Generate random 128-bit hex tracking IDs with a single urandom call"""
+    buf = os.urandom(16 * count)
+    return [buf[i:i + 16].hex() for i in range(0, len(buf), 16)]
+
+
+class _TrackingTable(OrderedDict):
+    """LRU-bounded tracking records that expire a fixed time after creation"""
+    
+    def __init__(self, maxsize: int, ttl: timedelta):
+        super().__init__()
+        self.maxsize = maxsize
+        self.ttl = ttl
+    
+    def __setitem__(self, key: str, value: Dict[str, Any]):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        while len(self) > self.maxsize:
+            self.popitem(last=False)
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        value = super().get(key)
+        if value is None:
+            return default
+        if datetime.now(timezone.utc) - value['created_at'] > self.ttl:
+            del self[key]
+            return default
+        self.move_to_end(key)
+        return value
+
+
+_TRACKING_TIMESTAMPS = ('created_at', 'last_click', 'last_download')
+
+
+def _encode_tracking(record: Dict[str, Any]) -> Dict[str, str]:
+    """JSON-encode tracking fields for a Redis hash"""
+    return {
+        key: json.dumps(value.isoformat() if isinstance(value, datetime) else value)
+        for key, value in record.items()
+    }
+
+
+def _decode_tracking(data: Dict[str, str]) -> Dict[str, Any]:
+    """Decode a Redis tracking hash back into a tracking record"""
+    record = {key: json.loads(value) for key, value in data.items()}
+    for key in _TRACKING_TIMESTAMPS:
+        if record.get(key):
+            record[key] = datetime.fromisoformat(record[key])
+    return record
+
+
+class _PooledSMTP:
+    """Pooled SMTP session, reconnected after max_messages sends"""
+    
+    def __init__(self, connect: Callable[[], smtplib.SMTP], max_messages: int):
+        self._connect = connect
+        self.max_messages = max_messages
+        self.smtp: Optional[smtplib.SMTP] = None
+        self.sent = 0
+    
+    def send(self, message: MIMEMultipart) -> Dict[str, Any]:
+        """Send one message, reconnecting once if the server dropped the session"""
+        if self.smtp is not None and self.sent >= self.max_messages:
+            self.close()
+        if self.smtp is None:
+            self.smtp = self._connect()
+            self.sent = 0
+        try:
+            refused = self.smtp.send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            self.smtp = self._connect()
+            self.sent = 0
+            refused = self.smtp.send_message(message)
+        self.sent += 1
+        return refused
+    
+    def send_batch(self, messages: List[MIMEMultipart]) -> List[Any]:
+        """Send messages back-to-back, one result or error per message"""
+        results = []
+        for message in messages:
+            try:
+                results.append(self.send(message))
+            except (smtplib.SMTPException, OSError) as e:
+                results.append(e)
+        return results
+    
+    def close(self):
+        """Close the session if open"""
+        if self.smtp is None:
+            return
+        try:
+            self.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self.smtp.close()
+        self.smtp = None
+
 
 class EmailGateway:
     """Zero-trust email gateway with link rewriting and attachment processing"""
@@ -38,18 +184,63 @@ class EmailGateway:
                 sandbox_cfg[key] = config[key]
         self.sandbox = RealTimeSandbox(sandbox_cfg)
         self.link_rewrite_domain = config.get('link_rewrite_domain', 'links.privik.com')
+        self._click_prefix = f"https://{self.link_rewrite_domain}/click/"
+        self._attachment_prefix = f"https://{self.link_rewrite_domain}/attachment/"
         self.attachment_storage = config.get('attachment_storage', '/tmp/attachments')
         self.zero_trust_policies = config.get('zero_trust_policies', {})
+        self._internal_suffixes = tuple(
+            domain.lower() for domain in self.zero_trust_policies.get('internal_domains', [])
+        )
+        self._blocked_senders = frozenset(self.zero_trust_policies.get('blocked_senders', []))
+        self._high_risk_users = frozenset(self.zero_trust_policies.get('high_risk_users', []))
         
         # Email routing configuration
         self.smtp_host = config.get('smtp_host', 'localhost')
         self.smtp_port = config.get('smtp_port', 587)
         self.smtp_username = config.get('smtp_username', '')
         self.smtp_password = config.get('smtp_password', '')
+        self.smtp_enabled = config.get('smtp_enabled', False)
+        self.smtp_starttls = config.get('smtp_starttls', self.smtp_port == 587)
+        self.smtp_timeout = config.get('smtp_timeout', 30)
+        
+        # Pool of SMTP sessions reused across emails; TLS and AUTH happen on
+        # connect only, and each session is recycled after smtp_max_messages
+        self.smtp_pool_size = config.get('smtp_pool_size', 5)
+        self.smtp_max_messages = config.get('smtp_max_messages', 100)
+        # LIFO so light traffic keeps reusing the most recently used session
+        self._smtp_pool: asyncio.LifoQueue = asyncio.LifoQueue()
+        for _ in range(self.smtp_pool_size):
+            self._smtp_pool.put_nowait(_PooledSMTP(self._connect_smtp, self.smtp_max_messages))
+        
+        # Outgoing messages are coalesced into batches sent back-to-back
+        self.delivery_batch_size = config.get('delivery_batch_size', 100)
+        self.delivery_batch_wait = config.get('delivery_batch_wait', 1.0)
+        self._delivery_queue: asyncio.Queue = asyncio.Queue()
+        self._delivery_task: Optional[asyncio.Task] = None
+        self._delivery_batches: set = set()
         
-        # Link tracking
-        self.link_tracking = {}
-        self.attachment_tracking = {}
+        # Sandbox analyses in progress, so concurrent clicks on the same URL
+        # (or downloads of the same attachment) share a single probe
+        self._sandbox_in_flight: Dict[Tuple[str, str], asyncio.Task] = {}
+        
+        # Content analysis requests are queued and sent to the analyzer in
+        # batches of up to analyze_batch_size, or every analyze_batch_wait seconds
+        self.analyze_batch_size = config.get('analyze_batch_size', 32)
+        self.analyze_batch_wait = config.get('analyze_batch_wait', 0.05)
+        self._analyze_queue: List[Tuple[Dict[str, str], asyncio.Future]] = []
+        self._analyze_timer: Optional[asyncio.TimerHandle] = None
+        self._analyze_batches: set = set()
+        
+        # Link tracking, bounded so a long-running gateway doesn't grow forever
+        tracking_max_entries = config.get('tracking_max_entries', 1_000_000)
+        self.tracking_ttl = timedelta(days=config.get('tracking_ttl_days', 30))
+        self.link_tracking = _TrackingTable(tracking_max_entries, self.tracking_ttl)
+        self.attachment_tracking = _TrackingTable(tracking_max_entries, self.tracking_ttl)
+        
+        # Shared tracking store so any worker can resolve a rewritten link;
+        # the in-process tables above act as a local cache in front of it
+        self.redis_url = config.get('redis_url', settings.redis_url)
+        self.redis: Optional[redis.Redis] = None
         
     async def initialize(self):
         """Initialize email gateway"""
@@ -58,9 +249,25 @@ class EmailGateway:
             await self.sandbox.initialize()
             
             # Create attachment storage directory
-            import os
             os.makedirs(self.attachment_storage, exist_ok=True)
             
+            # Connect to the shared tracking store; fall back to in-process
+            # tracking if Redis is unavailable
+            try:
+                self.redis = redis.Redis.from_url(
+                    self.redis_url,
+                    decode_responses=True,
+                    socket_connect_timeout=5,
+                    socket_timeout=5
+                )
+                await self.redis.ping()
+            except Exception as e:
+                logger.warning("Redis unavailable, using in-process link tracking", error=str(e))
+                self.redis = None
+            
+            if self.smtp_enabled:
+                self._delivery_task = asyncio.create_task(self._delivery_worker())
+            
             logger.info("Email gateway initialized successfully")
             return True
             
@@ -73,6 +280,9 @@ class EmailGateway:
         try:
             logger.info("Processing incoming email", message_id=email_data.get('message_id'))
             
+            # Single processing timestamp shared by every record this email creates
+            now = datetime.now(timezone.utc)
+            
             # 1. Initial email analysis
             initial_analysis = await self._analyze_email(email_data)
             
@@ -81,11 +291,11 @@ class EmailGateway:
             
             # 3. Process based on policy decision
             if policy_result['action'] == 'block':
-                return await self._block_email(email_data, policy_result)
+                return await self._block_email(email_data, policy_result, now=now)
             elif policy_result['action'] == 'quarantine':
-                return await self._quarantine_email(email_data, policy_result)
+                return await self._quarantine_email(email_data, policy_result, now=now)
             elif policy_result['action'] == 'rewrite':
-                return await self._rewrite_and_deliver(email_data, initial_analysis, policy_result)
+                return await self._rewrite_and_deliver(email_data, initial_analysis, policy_result, now=now)
             else:
                 return await self._deliver_email(email_data, initial_analysis)
                 
@@ -106,15 +316,16 @@ class EmailGateway:
             body = email_data.get('body_text', '') or email_data.get('body_html', '')
             sender = email_data.get('sender', '')
             
-            # Perform AI analysis
-            analysis_result = await analyze_email_content(
-                email_id=0,  # Will be set when stored in database
-                content=body,
-                subject=subject
-            )
+            # Perform AI analysis, batched with other in-flight emails
+            analysis_result = await self._analyze_content(body, subject, sender)
             
-            # Extract links
-            links = self._extract_links(body)
+            # Locate links once; the rewrite step splices at these offsets
+            link_spans = self._find_link_spans(body)
+            links = self._extract_links(body, link_spans)
+            if not email_data.get('body_text'):
+                # hrefs are looked up unescaped and unquoted ("href='...'" leaves a
+                # trailing quote in the match), so key HTML-sourced links the same way
+                links = list(dict.fromkeys(html.unescape(link).strip('\'"') for link in links))
             
             # Extract attachments
             attachments = email_data.get('attachments', [])
@@ -124,6 +335,8 @@ class EmailGateway:
                 'ai_verdict': analysis_result.get('ai_verdict', 'safe'),
                 'is_suspicious': analysis_result.get('is_suspicious', False),
                 'links': links,
+                'link_spans': link_spans,
+                'links_source': 'body_text' if email_data.get('body_text') else 'body_html',
                 'attachments': attachments,
                 'analysis_details': analysis_result
             }
@@ -135,10 +348,52 @@ class EmailGateway:
                 'ai_verdict': 'error',
                 'is_suspicious': False,
                 'links': [],
+                'link_spans': [],
+                'links_source': None,
                 'attachments': [],
                 'analysis_details': {'error': str(e)}
             }
     
+    async def _analyze_content(self, content: str, subject: str, sender: str) -> Dict[str, Any]:
+        """Queue content for the next batched analyzer call and wait for its result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._analyze_queue.append(({'content': content, 'subject': subject, 'sender': sender}, future))
+        
+        if len(self._analyze_queue) >= self.analyze_batch_size:
+            self._flush_analyze_queue()
+        elif self._analyze_timer is None:
+            self._analyze_timer = loop.call_later(self.analyze_batch_wait, self._flush_analyze_queue)
+        
+        return await future
+    
+    def _flush_analyze_queue(self):
+        """Hand every queued analysis request to one analyzer batch"""
+        if self._analyze_timer is not None:
+            self._analyze_timer.cancel()
+            self._analyze_timer = None
+        
+        batch, self._analyze_queue = self._analyze_queue, []
+        if batch:
+            task = asyncio.create_task(self._run_analyze_batch(batch))
+            self._analyze_batches.add(task)
+            task.add_done_callback(self._analyze_batches.discard)
+    
+    async def _run_analyze_batch(self, batch: List[Tuple[Dict[str, str], asyncio.Future]]):
+        """Analyze a batch and resolve each waiter with its own result"""
+        try:
+            results = await analyze_email_content_batch([item for item, _ in batch])
+        except Exception as e:
+            logger.error("Error in batched email analysis", size=len(batch), error=str(e))
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+    
     async def _apply_zero_trust_policies(self, email_data: Dict[str, Any], 
                                        analysis: Dict[str, Any]) -> Dict[str, Any]:
         """Apply zero-trust policies to email"""
@@ -200,12 +455,11 @@ class EmailGateway:
             recipients = email_data.get('recipients', [])
             
             # Policy 1: Block known malicious senders
-            if sender in self.zero_trust_policies.get('blocked_senders', []):
+            if sender in self._blocked_senders:
                 return {'action': 'block', 'reason': 'blocked_sender'}
             
             # Policy 2: Quarantine emails to high-risk users
-            high_risk_users = self.zero_trust_policies.get('high_risk_users', [])
-            if any(recipient in high_risk_users for recipient in recipients):
+            if not self._high_risk_users.isdisjoint(recipients):
                 return {'action': 'quarantine', 'reason': 'high_risk_recipient'}
             
             # Policy 3: Always rewrite emails with external links
@@ -222,24 +476,31 @@ class EmailGateway:
     
     async def _rewrite_and_deliver(self, email_data: Dict[str, Any], 
                                  analysis: Dict[str, Any], 
-                                 policy_result: Dict[str, Any]) -> Dict[str, Any]:
+                                 policy_result: Dict[str, Any],
+                                 now: Optional[datetime] = None) -> Dict[str, Any]:
         """Rewrite email with zero-trust modifications and deliver"""
         try:
+            now = now or datetime.now(timezone.utc)
             logger.info("Rewriting email for zero-trust delivery")
             
-            # Create rewritten email
-            rewritten_email = email_data.copy()
+            # Each rewrite step returns a new dict and leaves its input alone,
+            # so the caller's email_data is never modified
+            rewritten_email = email_data
             
             # Rewrite links
             if analysis['links']:
-                rewritten_email = await self._rewrite_links(rewritten_email, analysis['links'])
+                # Offsets from analysis are only valid for the body they were taken from
+                link_spans = analysis.get('link_spans') if analysis.get('links_source') == 'body_text' else None
+                rewritten_email = await self._rewrite_links(
+                    rewritten_email, analysis['links'], now=now, link_spans=link_spans
+                )
             
             # Process attachments
             if analysis['attachments']:
-                rewritten_email = await self._process_attachments(rewritten_email, analysis['attachments'])
+                rewritten_email = await self._process_attachments(rewritten_email, analysis['attachments'], now=now)
             
             # Add zero-trust headers
-            rewritten_email = self._add_zero_trust_headers(rewritten_email, analysis, policy_result)
+            rewritten_email = self._add_zero_trust_headers(rewritten_email, analysis, policy_result, now=now)
             
             # Deliver rewritten email
             delivery_result = await self._deliver_email(rewritten_email, analysis)
@@ -260,79 +521,125 @@ class EmailGateway:
                 'error': str(e)
             }
     
-    async def _rewrite_links(self, email_data: Dict[str, Any], links: List[str]) -> Dict[str, Any]:
+    async def _rewrite_links(self, email_data: Dict[str, Any], links: List[str],
+                             now: Optional[datetime] = None,
+                             link_spans: Optional[List[Tuple[int, int, str]]] = None) -> Dict[str, Any]:
         """Rewrite links for click-time analysis"""
         try:
+            now = now or datetime.now(timezone.utc)
             body_text = email_data.get('body_text', '')
             body_html = email_data.get('body_html', '')
             
-            # Rewrite links in text body
+            # One tracking link per original URL, shared by both bodies. Records are
+            # only created for URLs that are actually substituted; IDs for the
+            # analysed links are still drawn in one urandom call up front.
+            link_set = set(links)
+            spare_ids = _new_tracking_ids(len(links))
+            tracking_ids: List[str] = []
+            rewritten_links: Dict[str, str] = {}
+            
+            def _track(url: str) -> str:
+                rewritten = rewritten_links.get(url)
+                if rewritten is None:
+                    tracking_id = spare_ids.pop() if spare_ids else _new_tracking_ids(1)[0]
+                    tracking_ids.append(tracking_id)
+                    rewritten = self._create_rewritten_link(url, email_data, tracking_id, now)
+                    rewritten_links[url] = rewritten
+                return rewritten
+            
+            def _track_analysed(url: str) -> Optional[str]:
+                return _track(url) if url in link_set else None
+            
+            def _replace(match: re.Match) -> str:
+                url = match.group(0)
+                return _track_analysed(url) or url
+            
+            def _replace_href(match: re.Match) -> str:
+                if match.group(1):
+                    return match.group(0)
+                url = html.unescape(match.group(5)).strip()
+                # hrefs that didn't appear in the analysed body still get tracked
+                if not _URL_RE.fullmatch(url):
+                    return match.group(0)
+                return f"{match.group(3)}{match.group(4)}{_track(url)}{match.group(4)}"
+            
+            rewritten_email = dict(email_data)
+            
+            # Single pass per body; rewritten URLs are never rescanned. When the
+            # analysis already located the text body's URLs, splice at those
+            # offsets instead of scanning again.
             if body_text:
-                for link in links:
-                    rewritten_link = await self._create_rewritten_link(link, email_data)
-                    body_text = body_text.replace(link, rewritten_link)
-                email_data['body_text'] = body_text
+                if link_spans is not None:
+                    rewritten_email['body_text'] = _splice_links(body_text, link_spans, _track_analysed)
+                else:
+                    rewritten_email['body_text'] = _URL_RE.sub(_replace, body_text)
             
-            # Rewrite links in HTML body
+            # HTML bodies only have href attribute values rewritten, so URLs in
+            # visible text, scripts and styles are left alone
             if body_html:
-                for link in links:
-                    rewritten_link = await self._create_rewritten_link(link, email_data)
-                    body_html = body_html.replace(link, rewritten_link)
-                email_data['body_html'] = body_html
+                rewritten_email['body_html'] = _HTML_HREF_RE.sub(_replace_href, body_html)
             
-            return email_data
+            if tracking_ids:
+                await self._store_tracking('link', self.link_tracking, tracking_ids)
+            
+            # One summary line per email; per-link detail is logged at DEBUG
+            logger.info("Rewrote links",
+                       message_id=email_data.get('message_id'),
+                       links_rewritten=len(tracking_ids))
+            
+            return rewritten_email
             
         except Exception as e:
             logger.error("Error rewriting links", error=str(e))
             return email_data
     
-    async def _create_rewritten_link(self, original_url: str, email_data: Dict[str, Any]) -> str:
+    def _create_rewritten_link(self, original_url: str, email_data: Dict[str, Any],
+                               tracking_id: Optional[str] = None,
+                               now: Optional[datetime] = None) -> str:
         """Create rewritten link for click-time analysis"""
-        try:
-            # Generate unique tracking ID
-            tracking_id = str(uuid.uuid4())
-            
-            # Create tracking record
-            self.link_tracking[tracking_id] = {
-                'original_url': original_url,
-                'email_id': email_data.get('message_id'),
-                'sender': email_data.get('sender'),
-                'recipients': email_data.get('recipients', []),
-                'created_at': datetime.utcnow(),
-                'clicks': 0
-            }
-            
-            # Create rewritten URL
-            rewritten_url = f"https://{self.link_rewrite_domain}/click/{tracking_id}"
-            
-            logger.info("Created rewritten link", 
-                       original_url=original_url, 
-                       rewritten_url=rewritten_url,
-                       tracking_id=tracking_id)
-            
-            return rewritten_url
-            
-        except Exception as e:
-            logger.error("Error creating rewritten link", error=str(e))
-            return original_url
+        # Generate unique tracking ID unless the caller drew one in bulk
+        if tracking_id is None:
+            tracking_id = _new_tracking_ids(1)[0]
+        
+        # Create tracking record
+        self.link_tracking[tracking_id] = {
+            'original_url': original_url,
+            'email_id': email_data.get('message_id'),
+            'sender': email_data.get('sender'),
+            'recipients': email_data.get('recipients', []),
+            'created_at': now or datetime.now(timezone.utc),
+            'clicks': 0
+        }
+        
+        # Create rewritten URL
+        rewritten_url = self._click_prefix + tracking_id
+        
+        logger.debug("Created rewritten link", 
+                    original_url=original_url, 
+                    rewritten_url=rewritten_url,
+                    tracking_id=tracking_id)
+        
+        return rewritten_url
     
     async def _process_attachments(self, email_data: Dict[str, Any], 
-                                 attachments: List[Dict[str, Any]]) -> Dict[str, Any]:
+                                 attachments: List[Dict[str, Any]],
+                                 now: Optional[datetime] = None) -> Dict[str, Any]:
         """Process attachments for zero-trust delivery"""
         try:
+            now = now or datetime.now(timezone.utc)
             processed_attachments = []
             
-            for attachment in attachments:
-                # Generate unique attachment ID
-                attachment_id = str(uuid.uuid4())
-                
+            # Draw every attachment ID for this email in one urandom call
+            attachment_ids = _new_tracking_ids(len(attachments))
+            
+            for attachment, attachment_id in zip(attachments, attachment_ids):
                 # Create tracking record
                 self.attachment_tracking[attachment_id] = {
                     'original_filename': attachment.get('filename'),
                     'content_type': attachment.get('content_type'),
                     'size': attachment.get('size'),
                     'email_id': email_data.get('message_id'),
-                    'created_at': datetime.utcnow(),
+                    'created_at': now,
                     'downloads': 0
                 }
                 
@@ -342,60 +649,114 @@ class EmailGateway:
                     'content_type': attachment.get('content_type'),
                     'size': attachment.get('size'),
                     'attachment_id': attachment_id,
-                    'download_url': f"https://{self.link_rewrite_domain}/attachment/{attachment_id}"
+                    'download_url': self._attachment_prefix + attachment_id
                 }
                 
                 processed_attachments.append(processed_attachment)
             
-            # Replace original attachments with processed ones
-            email_data['attachments'] = processed_attachments
+            await self._store_tracking('attachment', self.attachment_tracking, attachment_ids)
             
-            return email_data
+            # Replace original attachments with processed ones
+            return {**email_data, 'attachments': processed_attachments}
             
         except Exception as e:
             logger.error("Error processing attachments", error=str(e))
             return email_data
     
+    async def _store_tracking(self, kind: str, table: _TrackingTable, tracking_ids: List[str]):
+        """Persist new tracking records to Redis in one pipelined round-trip"""
+        if not self.redis:
+            return
+        try:
+            ttl = int(self.tracking_ttl.total_seconds())
+            pipe = self.redis.pipeline(transaction=False)
+            for tracking_id in tracking_ids:
+                record = table.get(tracking_id)
+                if record is None:
+                    continue
+                key = f"{kind}:{tracking_id}"
+                pipe.hset(key, mapping=_encode_tracking(record))
+                pipe.expire(key, ttl)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning("Failed to persist tracking records", kind=kind, error=str(e))
+    
+    async def _load_tracking(self, kind: str, table: _TrackingTable, tracking_id: str) -> Optional[Dict[str, Any]]:
+        """Look up a tracking record locally, then in Redis"""
+        tracking_info = table.get(tracking_id)
+        if tracking_info is not None or not self.redis:
+            return tracking_info
+        try:
+            data = await self.redis.hgetall(f"{kind}:{tracking_id}")
+        except Exception as e:
+            logger.warning("Failed to load tracking record", kind=kind, error=str(e))
+            return None
+        if not data:
+            return None
+        tracking_info = _decode_tracking(data)
+        table[tracking_id] = tracking_info
+        return tracking_info
+    
+    async def _record_tracking_event(self, kind: str, tracking_id: str, counter: str, fields: Dict[str, Any]):
+        """Bump a tracking counter and store event fields in Redis"""
+        if not self.redis:
+            return
+        try:
+            key = f"{kind}:{tracking_id}"
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hincrby(key, counter, 1)
+            pipe.hset(key, mapping=_encode_tracking(fields))
+            await pipe.execute()
+        except Exception as e:
+            logger.warning("Failed to record tracking event", kind=kind, error=str(e))
+    
     def _add_zero_trust_headers(self, email_data: Dict[str, Any], 
                               analysis: Dict[str, Any], 
-                              policy_result: Dict[str, Any]) -> Dict[str, Any]:
+                              policy_result: Dict[str, Any],
+                              now: Optional[datetime] = None) -> Dict[str, Any]:
         """Add zero-trust headers to email"""
-        try:
-            headers = email_data.get('headers', {})
-            
-            # Add Privik security headers
-            headers['X-Privik-Security'] = 'Zero-Trust'
-            headers['X-Privik-Threat-Score'] = str(analysis.get('threat_score', 0.0))
-            headers['X-Privik-AI-Verdict'] = analysis.get('ai_verdict', 'safe')
-            headers['X-Privik-Policy'] = policy_result.get('policy_applied', 'zero_trust')
-            headers['X-Privik-Processed'] = datetime.utcnow().isoformat()
-            
-            # Add warning for suspicious emails
-            if analysis.get('is_suspicious', False):
-                headers['X-Privik-Warning'] = 'This email has been flagged as suspicious'
-            
-            email_data['headers'] = headers
-            return email_data
-            
-        except Exception as e:
-            logger.error("Error adding zero-trust headers", error=str(e))
-            return email_data
+        # Copy so the original message's headers dict isn't modified
+        headers = dict(email_data.get('headers', {}))
+        
+        # Add Privik security headers
+        headers[_HEADER_SECURITY] = 'Zero-Trust'
+        headers[_HEADER_THREAT_SCORE] = str(analysis.get('threat_score', 0.0))
+        headers[_HEADER_AI_VERDICT] = analysis.get('ai_verdict', 'safe')
+        headers[_HEADER_POLICY] = policy_result.get('policy_applied', 'zero_trust')
+        headers[_HEADER_PROCESSED] = (now or datetime.now(timezone.utc)).isoformat()
+        
+        # Add warning for suspicious emails
+        if analysis.get('is_suspicious', False):
+            headers[_HEADER_WARNING] = 'This email has been flagged as suspicious'
+        
+        return {**email_data, 'headers': headers}
     
     async def _deliver_email(self, email_data: Dict[str, Any], 
                            analysis: Dict[str, Any]) -> Dict[str, Any]:
         """Deliver email to recipients"""
         try:
-            # For MVP, log delivery
-            # In production, integrate with actual SMTP server
-            
             logger.info("Delivering email", 
                        message_id=email_data.get('message_id'),
                        recipients=email_data.get('recipients', []))
             
+            # Without an SMTP relay configured, delivery is only logged
+            refused = {}
+            if self.smtp_enabled:
+                message = self._build_message(email_data)
+                if self._delivery_task:
+                    future = asyncio.get_running_loop().create_future()
+                    await self._delivery_queue.put((message, future))
+                    refused = await future
+                else:
+                    refused = (await self._send_pooled([message]))[0]
+                    if isinstance(refused, Exception):
+                        raise refused
+            
             return {
                 'status': 'delivered',
-                'delivery_time': datetime.utcnow(),
-                'recipients': email_data.get('recipients', [])
+                'delivery_time': datetime.now(timezone.utc),
+                'recipients': email_data.get('recipients', []),
+                'refused_recipients': list(refused)
             }
             
         except Exception as e:
@@ -405,8 +766,99 @@ class EmailGateway:
                 'error': str(e)
             }
     
+    def _build_message(self, email_data: Dict[str, Any]) -> MIMEMultipart:
+        """Build a MIME message from processed email data"""
+        message = MIMEMultipart('alternative')
+        message['From'] = email_data.get('sender', '')
+        message['To'] = ', '.join(email_data.get('recipients', []))
+        message['Subject'] = email_data.get('subject', '')
+        if email_data.get('message_id'):
+            message['Message-ID'] = email_data['message_id']
+        for name, value in email_data.get('headers', {}).items():
+            if name.startswith('X-Privik-'):
+                message[name] = value
+        
+        if email_data.get('body_text'):
+            message.attach(MIMEText(email_data['body_text'], 'plain'))
+        if email_data.get('body_html'):
+            message.attach(MIMEText(email_data['body_html'], 'html'))
+        return message
+    
+    def _connect_smtp(self) -> smtplib.SMTP:
+        """Open and authenticate a new SMTP session"""
+        smtp = smtplib.SMTP(self.smtp_host, self.smtp_port, timeout=self.smtp_timeout)
+        if self.smtp_starttls:
+            smtp.starttls()
+        if self.smtp_username:
+            smtp.login(self.smtp_username, self.smtp_password)
+        return smtp
+    
+    async def _send_pooled(self, messages: List[MIMEMultipart]) -> List[Any]:
+        """Send messages over a session checked out of the pool"""
+        connection = await self._smtp_pool.get()
+        try:
+            return await asyncio.to_thread(connection.send_batch, messages)
+        finally:
+            self._smtp_pool.put_nowait(connection)
+    
+    async def _deliver_batch(self, batch: List[Tuple[MIMEMultipart, asyncio.Future]]):
+        """Send a queued batch and resolve each waiter with its result"""
+        try:
+            results = await self._send_pooled([message for message, _ in batch])
+        except Exception as e:
+            logger.error("Error delivering email batch", size=len(batch), error=str(e))
+            results = [e] * len(batch)
+        
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+    
+    async def _delivery_worker(self):
+        """Drain the delivery queue in batches; batches go out concurrently over the pool"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = []
+            try:
+                batch.append(await self._delivery_queue.get())
+                deadline = loop.time() + self.delivery_batch_wait
+                while len(batch) < self.delivery_batch_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._delivery_queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                # Shutting down: messages already taken off the queue still go out
+                self._start_delivery_batch(batch)
+                raise
+            
+            self._start_delivery_batch(batch)
+    
+    def _start_delivery_batch(self, batch: List[Tuple[MIMEMultipart, asyncio.Future]]):
+        """Send a batch in the background, tracked so cleanup can wait for it"""
+        if not batch:
+            return
+        task = asyncio.create_task(self._deliver_batch(batch))
+        self._delivery_batches.add(task)
+        task.add_done_callback(self._delivery_batches.discard)
+    
+    def _drain_delivery_queue(self):
+        """Hand every message still queued to a delivery batch"""
+        while not self._delivery_queue.empty():
+            batch = []
+            while len(batch) < self.delivery_batch_size and not self._delivery_queue.empty():
+                batch.append(self._delivery_queue.get_nowait())
+            self._start_delivery_batch(batch)
+    
     async def _block_email(self, email_data: Dict[str, Any], 
-                         policy_result: Dict[str, Any]) -> Dict[str, Any]:
+                         policy_result: Dict[str, Any],
+                         now: Optional[datetime] = None) -> Dict[str, Any]:
         """Block email based on policy"""
         try:
             logger.info("Blocking email", 
@@ -417,7 +869,7 @@ class EmailGateway:
                 'status': 'blocked',
                 'action': 'block',
                 'reason': policy_result.get('reason'),
-                'blocked_at': datetime.utcnow()
+                'blocked_at': now or datetime.now(timezone.utc)
             }
             
         except Exception as e:
@@ -429,7 +881,8 @@ class EmailGateway:
             }
     
     async def _quarantine_email(self, email_data: Dict[str, Any], 
-                              policy_result: Dict[str, Any]) -> Dict[str, Any]:
+                              policy_result: Dict[str, Any],
+                              now: Optional[datetime] = None) -> Dict[str, Any]:
         """Quarantine email for review"""
         try:
             logger.info("Quarantining email", 
@@ -443,7 +896,7 @@ class EmailGateway:
                 'status': 'quarantined',
                 'action': 'quarantine',
                 'reason': policy_result.get('reason'),
-                'quarantined_at': datetime.utcnow()
+                'quarantined_at': now or datetime.now(timezone.utc)
             }
             
         except Exception as e:
@@ -454,60 +907,66 @@ class EmailGateway:
                 'error': str(e)
             }
     
-    def _extract_links(self, content: str) -> List[str]:
-        """Extract links from email content"""
-        try:
-            # URL regex pattern
-            url_pattern = r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
-            links = re.findall(url_pattern, content)
-            
-            # Remove duplicates and filter
-            unique_links = list(set(links))
-            filtered_links = [link for link in unique_links if self._is_valid_url(link)]
-            
-            return filtered_links
-            
-        except Exception as e:
-            logger.error("Error extracting links", error=str(e))
-            return []
+    def _find_link_spans(self, content: str) -> List[Tuple[int, int, str]]:
+        """Locate every URL in content as (start, end, url)"""
+        return [(match.start(), match.end(), match.group(0)) for match in _URL_RE.finditer(content)]
     
-    def _is_valid_url(self, url: str) -> bool:
-        """Check if URL is valid"""
-        try:
-            parsed = urlparse(url)
-            return bool(parsed.scheme and parsed.netloc)
-        except:
-            return False
+    def _extract_links(self, content: str,
+                       link_spans: Optional[List[Tuple[int, int, str]]] = None) -> List[str]:
+        """Extract links from email content"""
+        if link_spans is None:
+            link_spans = self._find_link_spans(content)
+        
+        # Deduplicate in first-seen order. _URL_RE already guarantees an
+        # http(s) scheme, so only an empty host ("https:///x") is rejected
+        # instead of running urlparse on every link.
+        return [
+            link for link in dict.fromkeys(url for _, _, url in link_spans)
+            if link[link.index('://') + 3] not in '/?#'
+        ]
     
     def _is_internal_domain(self, url: str) -> bool:
         """Check if URL is from internal domain"""
         try:
-            parsed = urlparse(url)
-            domain = parsed.netloc.lower()
-            
-            # Check against internal domains
-            internal_domains = self.zero_trust_policies.get('internal_domains', [])
-            return any(domain.endswith(internal_domain.lower()) for internal_domain in internal_domains)
-            
-        except:
+            netloc = _url_netloc(url)
+        except ValueError:
             return False
+        # str.endswith checks every internal suffix in one call
+        return netloc.endswith(self._internal_suffixes)
+    
+    async def _analyze_once(self, key: Tuple[str, str], analyze: Callable[[], Awaitable[Any]]) -> Any:
+        """Run a sandbox analysis, joining an identical one already in flight"""
+        task = self._sandbox_in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(analyze())
+            self._sandbox_in_flight[key] = task
+            task.add_done_callback(lambda _: self._sandbox_in_flight.pop(key, None))
+        # Shield so one cancelled request doesn't abort the others' analysis
+        return await asyncio.shield(task)
     
     async def handle_link_click(self, tracking_id: str, user_context: Dict[str, Any]) -> Dict[str, Any]:
         """Handle click on rewritten link"""
         try:
             # Get tracking information
-            tracking_info = self.link_tracking.get(tracking_id)
+            tracking_info = await self._load_tracking('link', self.link_tracking, tracking_id)
             if not tracking_info:
                 return {'status': 'error', 'reason': 'tracking_id_not_found'}
             
             # Update click count
             tracking_info['clicks'] += 1
-            tracking_info['last_click'] = datetime.utcnow()
+            tracking_info['last_click'] = datetime.now(timezone.utc)
             tracking_info['user_context'] = user_context
+            await self._record_tracking_event('link', tracking_id, 'clicks', {
+                'last_click': tracking_info['last_click'],
+                'user_context': user_context
+            })
             
             # Perform real-time analysis
             original_url = tracking_info['original_url']
-            sandbox_result = await self.sandbox.analyze_link_click(original_url, user_context)
+            sandbox_result = await self._analyze_once(
+                ('link', original_url),
+                lambda: self.sandbox.analyze_link_click(original_url, user_context)
+            )
             
             # Log click event
             logger.info("Link click analyzed", 
@@ -544,20 +1003,27 @@ class EmailGateway:
         """Handle attachment download request"""
         try:
             # Get tracking information
-            tracking_info = self.attachment_tracking.get(attachment_id)
+            tracking_info = await self._load_tracking('attachment', self.attachment_tracking, attachment_id)
             if not tracking_info:
                 return {'status': 'error', 'reason': 'attachment_id_not_found'}
             
             # Update download count
             tracking_info['downloads'] += 1
-            tracking_info['last_download'] = datetime.utcnow()
+            tracking_info['last_download'] = datetime.now(timezone.utc)
             tracking_info['user_context'] = user_context
+            await self._record_tracking_event('attachment', attachment_id, 'downloads', {
+                'last_download': tracking_info['last_download'],
+                'user_context': user_context
+            })
             
             # Perform real-time analysis
             file_path = f"{self.attachment_storage}/{attachment_id}"
             file_type = tracking_info.get('content_type', '')
             
-            sandbox_result = await self.sandbox.analyze_attachment(file_path, file_type)
+            sandbox_result = await self._analyze_once(
+                ('attachment', file_path),
+                lambda: self.sandbox.analyze_attachment(file_path, file_type)
+            )
             
             # Log download event
             logger.info("Attachment download analyzed", 
@@ -594,6 +1060,26 @@ class EmailGateway:
         """Cleanup email gateway resources"""
         try:
             await self.sandbox.cleanup()
+            if self.redis:
+                await self.redis.close()
+                self.redis = None
+            if self._delivery_task:
+                self._delivery_task.cancel()
+                try:
+                    await self._delivery_task
+                except asyncio.CancelledError:
+                    pass
+                self._delivery_task = None
+                # New deliveries now bypass the queue; whatever was left in it is
+                # still sent, so no _deliver_email caller waits forever
+                self._drain_delivery_queue()
+            self._flush_analyze_queue()
+            if self._analyze_batches or self._delivery_batches:
+                await asyncio.gather(*self._analyze_batches, *self._delivery_batches, return_exceptions=True)
+            for _ in range(self._smtp_pool.qsize()):
+                connection = self._smtp_pool.get_nowait()
+                await asyncio.to_thread(connection.close)
+                self._smtp_pool.put_nowait(connection)
             logger.info("Email gateway cleaned up")
         except Exception as e:
             logger.error("Error cleaning up email gateway", error=str(e))
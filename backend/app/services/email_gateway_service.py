@@ -4,30 +4,59 @@ Real-time email processing and threat detection pipeline
 """
 
 import asyncio
-import json
-from typing import Dict, Any, List, Optional
+import re
+import sys
+import bisect
+import time
+import hashlib
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timedelta
 import structlog
-from dataclasses import dataclass
+from collections import OrderedDict, deque
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import insert
+from dataclasses import dataclass, asdict
 from enum import Enum
 
 from .email_integrations import EmailIntegrationManager
-from .ai_threat_detection import AIThreatDetection
+from .ai_threat_detection import AIThreatDetection, ThreatPrediction
 from .email_authentication import email_auth_service
 from .reputation_service import reputation_service
 from .link_rewriter import get_link_rewriter
 from .email_header_analyzer import email_header_analyzer
-from .attachment_validator import get_attachment_validator
+from .attachment_validator import get_attachment_validator, AttachmentRisk
 # from .sandbox import SandboxService  # TODO: Implement SandboxService class
 from ..models.email import Email, EmailAttachment
 from ..models.click import ClickEvent
 from ..models.threat import ThreatIntel, ThreatIndicator
-from ..database import get_db
+from ..database import SessionLocal
 from .training_logger import TrainingLogger
 from ..core.config import get_settings
+from ..utils.compat import DATACLASS_SLOTS
 
 logger = structlog.get_logger()
 
+# Threat score contributed by an attachment at each risk level
+_ATTACHMENT_RISK_SCORES = {
+    AttachmentRisk.SAFE: 0.0,
+    AttachmentRisk.LOW: 0.2,
+    AttachmentRisk.MEDIUM: 0.5,
+    AttachmentRisk.HIGH: 0.8,
+    AttachmentRisk.CRITICAL: 1.0,
+}
+
+# Weight of each analysis component in the combined threat score
+_COMPONENT_WEIGHT = 0.2
+
+
+@lru_cache(maxsize=100_000)
+def _sender_domain(email_address: str) -> str:
+    """Lower-cased domain of an address; senders repeat heavily, so results are cached"""
+    # rpartition keeps the part after the last '@' and returns the whole string when there is none;
+    # rstrip drops the closing bracket of "Name <user@domain>" forms
+    return email_address.rpartition('@')[2].rstrip('> \t').lower()
+
 
 class EmailAction(Enum):
     """Email processing actions"""
@@ -37,7 +66,7 @@ class EmailAction(Enum):
     SANDBOX = "sandbox"
 
 
-@dataclass
+@dataclass(frozen=True, **DATACLASS_SLOTS)
 class EmailProcessingResult:
     """Result of email processing"""
     email_id: str
@@ -45,12 +74,81 @@ class EmailProcessingResult:
     threat_score: float
     threat_type: str
     confidence: float
-    indicators: List[str]
+    indicators: Tuple[str, ...]
     processing_time: float
     sandbox_result: Optional[Dict[str, Any]] = None
     ai_analysis: Optional[Dict[str, Any]] = None
 
 
+@dataclass(**DATACLASS_SLOTS)
+class GatewayStatistics:
+    """Running email processing counters"""
+    emails_processed: int = 0
+    threats_detected: int = 0
+    emails_quarantined: int = 0
+    emails_blocked: int = 0
+    processing_time_avg: float = 0.0
+
+
+class _EmailRing:
+    """Bounded FIFO of pending emails, drained a whole batch at a time by a single consumer"""
+    
+    def __init__(self, maxsize: int = 0):
+        self._items = deque()
+        self._maxsize = maxsize  # <= 0 means unbounded, as with asyncio.Queue
+        # Set exactly while items are waiting / while there is room for more
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+    
+    def qsize(self) -> int:
+        return len(self._items)
+    
+    def full(self) -> bool:
+        return 0 < self._maxsize <= len(self._items)
+    
+    def put_nowait(self, item: Any):
+        if self.full():
+            raise asyncio.QueueFull
+        self._items.append(item)
+        self._not_empty.set()
+    
+    async def put(self, item: Any):
+        """Append an item, waiting while the ring is full"""
+        while self.full():
+            self._not_full.clear()
+            await self._not_full.wait()
+        self.put_nowait(item)
+    
+    def _take(self, count: int) -> List[Any]:
+        items = self._items
+        batch = [items.popleft() for _ in range(min(count, len(items)))]
+        if not items:
+            self._not_empty.clear()
+        self._not_full.set()
+        return batch
+    
+    async def get_batch(self, max_items: int, max_wait: float, timeout: Optional[float] = None) -> List[Any]:
+        """Wait up to timeout for the first item, then gather more for up to max_wait seconds"""
+        if not self._items:
+            await asyncio.wait_for(self._not_empty.wait(), timeout=timeout)
+        batch = self._take(max_items)
+        
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max_wait
+        while len(batch) < max_items:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(self._not_empty.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            batch.extend(self._take(max_items - len(batch)))
+        
+        return batch
+
+
 class EmailGatewayService:
     """Main email gateway service for real-time email processing"""
     
@@ -61,18 +159,41 @@ class EmailGatewayService:
         self.link_rewriter = None
         self.attachment_validator = None
         # self.sandbox_service = None  # TODO: Implement SandboxService
-        self.processing_queue = asyncio.Queue()
+        # Bounded so a burst makes producers wait instead of buffering every email in memory
+        self.processing_queue = _EmailRing(maxsize=config.get('queue_maxsize', 1000))
+        self.processing_batch_size = config.get('processing_batch_size', 64)
+        self.processing_batch_wait = config.get('processing_batch_wait', 0.05)
+        # Caps how many emails of a batch run through the pipeline at once
+        self._processing_semaphore = asyncio.Semaphore(config.get('max_concurrency', 32))
+        # Upper bound for each concurrent analysis step of the pipeline
+        self.step_timeout = config.get('pipeline_step_timeout', 10.0)
+        
+        # Email inserts are queued and written in one transaction per batch of up
+        # to db_batch_size emails, or every db_batch_wait seconds
+        self.db_batch_size = config.get('db_batch_size', 500)
+        self.db_batch_wait = config.get('db_batch_wait', 0.05)
+        # The driver is synchronous; DB round-trips run on a dedicated pool, sized to
+        # the engine's connection pool, rather than on the event loop or the shared
+        # default executor. Created on demand so a stop/start cycle gets a fresh one.
+        self.db_workers = config.get('db_workers', 16)
+        self._db_pool: Optional[ThreadPoolExecutor] = None
+        self._store_queue: List[Tuple[Email, List[Dict[str, Any]], asyncio.Future]] = []
+        self._store_timer: Optional[asyncio.TimerHandle] = None
+        self._store_batches: set = set()
+        
+        # LRU of recent authentication verdicts: key -> (expires_at, result)
+        self._auth_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._auth_cache_size = config.get('auth_cache_size', 10000)
+        self._auth_cache_ttl = config.get('auth_cache_ttl', 300)
         self.is_running = False
+        # Caps concurrent sandbox submissions across all emails being processed
+        self._sandbox_semaphore = asyncio.Semaphore(config.get('sandbox_concurrency', 8))
         self.training_logger: Optional[TrainingLogger] = None
         
         # Processing statistics
-        self.stats = {
-            'emails_processed': 0,
-            'threats_detected': 0,
-            'emails_quarantined': 0,
-            'emails_blocked': 0,
-            'processing_time_avg': 0.0
-        }
+        self.stats = GatewayStatistics()
+        # Per-email progress is logged for one email in every log_sample_rate
+        self.log_sample_rate = max(1, config.get('log_sample_rate', 1000))
         
         # Zero-trust policies
         self.zero_trust_policies = {
@@ -89,6 +210,37 @@ class EmailGatewayService:
                 'bank transfer', 'click here', 'login now'
             ]
         }
+        self._keywords: Optional[tuple] = None
+        self._compile_policies()
+    
+    def _compile_policies(self):
+        """Precompile lookup structures derived from the zero-trust policies"""
+        self._blacklist = self._domain_set(self.zero_trust_policies.get('blacklist_domains', []))
+        self._whitelist = self._domain_set(self.zero_trust_policies.get('whitelist_domains', []))
+        
+        # Ascending (threshold, action) table; ties resolve to the stricter action
+        thresholds = self.zero_trust_policies.get('threat_thresholds', {})
+        ladder = sorted(
+            ((thresholds[name], EmailAction(name)) for name in ('sandbox', 'quarantine', 'block') if name in thresholds),
+            key=lambda entry: entry[0]
+        )
+        self._threshold_scores = [score for score, _ in ladder]
+        self._threshold_actions = [EmailAction.ALLOW] + [action for _, action in ladder]
+        
+        # Longest first so overlapping keywords report the most specific match
+        keywords = tuple(sorted(
+            {k.lower() for k in self.zero_trust_policies.get('suspicious_keywords', []) if k},
+            key=lambda k: (-len(k), k)
+        ))
+        # Only recompile when an update actually changed the keyword set
+        if keywords != self._keywords:
+            self._keywords = keywords
+            self._keyword_pattern = re.compile('|'.join(map(re.escape, keywords))) if keywords else None
+    
+    @staticmethod
+    def _domain_set(domains: List[str]) -> frozenset:
+        """Normalize policy domains the way _extract_domain normalizes senders"""
+        return frozenset(filter(None, (d.strip().lower().lstrip('@') for d in domains if d)))
     
     async def initialize(self) -> bool:
         """Initialize the email gateway service"""
@@ -118,6 +270,9 @@ class EmailGatewayService:
                 'storage_path': './training_data'
             })
             self.training_logger = TrainingLogger(training_logger_config)
+            
+            # Thread pool for the batched email inserts
+            self._get_db_pool()
 
             # Initialize sandbox service (TODO: Implement SandboxService)
             # sandbox_config = self.config.get('sandbox', {})
@@ -159,6 +314,14 @@ class EmailGatewayService:
         try:
             self.is_running = False
             
+            # Write out any emails still waiting for a batched insert
+            self._flush_store_queue()
+            if self._store_batches:
+                await asyncio.gather(*self._store_batches, return_exceptions=True)
+            if self._db_pool is not None:
+                self._db_pool.shutdown(wait=False)
+                self._db_pool = None
+            
             # Cleanup integrations
             if self.email_integrations:
                 await self.email_integrations.cleanup()
@@ -176,72 +339,125 @@ class EmailGatewayService:
         except Exception as e:
             logger.error(f"Error stopping Email Gateway Service: {e}")
     
-    async def process_email(self, email_data: Dict[str, Any]) -> EmailProcessingResult:
+    async def process_email_batch(self, batch: List[Dict[str, Any]]) -> List[EmailProcessingResult]:
+        """Process a batch of emails concurrently, sharing one AI model pass"""
+        ai_results = [None] * len(batch)
+        # Emails from listed domains never reach the model
+        unlisted = [
+            index for index, email_data in enumerate(batch)
+            if self._domain_list_action(self._extract_domain(email_data.get('sender', ''))) is None
+        ]
+        try:
+            predictions = await self.ai_threat_detection.predict_email_threat_batch([batch[i] for i in unlisted])
+            for index, prediction in zip(unlisted, predictions):
+                ai_results[index] = prediction
+        except Exception as e:
+            logger.error(f"Error running batch AI threat detection: {e}")
+        
+        results = await asyncio.gather(*(
+            self._process_email_limited(email_data, ai_result)
+            for email_data, ai_result in zip(batch, ai_results)
+        ), return_exceptions=True)
+        
+        # One failing email must not discard the rest of the batch
+        for index, result in enumerate(results):
+            if isinstance(result, Exception):
+                logger.error(f"Error processing email in batch: {result}")
+                results[index] = self._error_result(0.0)
+        return results
+    
+    async def _process_email_limited(self, email_data: Dict[str, Any], ai_result) -> EmailProcessingResult:
+        """Run process_email under the batch concurrency limit"""
+        async with self._processing_semaphore:
+            return await self.process_email(email_data, ai_result=ai_result)
+    
+    async def process_email(self, email_data: Dict[str, Any], ai_result=None) -> EmailProcessingResult:
         """Process a single email through the comprehensive threat detection pipeline"""
-        start_time = datetime.utcnow()
+        start_time = time.perf_counter()
         
         try:
-            logger.info(f"Processing email: {email_data.get('subject', 'No Subject')}")
-            
-            # Step 1: Store email in database
-            email_record = await self._store_email(email_data)
-            
-            # Step 2: Email authentication validation (DMARC, DKIM, SPF)
-            auth_result = await self._validate_email_authentication(email_data)
-            
-            # Step 3: Reputation checking
-            reputation_result = await self._check_reputation(email_data)
-            
-            # Step 4: Header analysis
-            header_result = await self._analyze_headers(email_data)
-            
-            # Step 5: Link rewriting and analysis
-            link_result = await self._rewrite_links(email_data, str(email_record.id))
-            
-            # Step 6: Attachment validation
-            attachment_result = await self._validate_attachments(email_data)
-            
-            # Step 7: AI threat detection
-            ai_result = await self.ai_threat_detection.predict_email_threat(email_data)
-            # Phase 1: intent labeling for training
-            intent_result = await self.ai_threat_detection.predict_email_intent(email_data)
+            sender_domain = self._extract_domain(email_data.get('sender', ''))
+            auth_result = reputation_result = header_result = intent_result = None
             
-            # Step 8: Calculate combined threat score
-            combined_threat_score = self._calculate_combined_threat_score(
-                auth_result, reputation_result, header_result, attachment_result, ai_result
-            )
+            # Blacklisted/whitelisted senders have a fixed verdict, skip the analysis stages
+            listed_action = self._domain_list_action(sender_domain)
+            if listed_action is not None:
+                ai_result = self._domain_list_prediction(listed_action)
+                combined_threat_score = ai_result.threat_score
+                action = listed_action
+            else:
+                # Steps 1-5 only depend on email_data, so they run concurrently:
+                # authentication (DMARC, DKIM, SPF), reputation, headers, attachments,
+                # intent labeling for training and AI threat detection (precomputed
+                # when called from a batch)
+                steps = [
+                    self._run_step('authentication', self._validate_email_authentication(email_data)),
+                    self._run_step('reputation', self._check_reputation(email_data), {'score': 0.5}),
+                    self._run_step('headers', self._analyze_headers(email_data)),
+                    self._run_step('attachments', self._validate_attachments(email_data), []),
+                    self._run_step('intent', self.ai_threat_detection.predict_email_intent(email_data), {}),
+                ]
+                if ai_result is None:
+                    steps.append(self._run_step('ai_threat_detection', self.ai_threat_detection.predict_email_threat(email_data)))
+                
+                step_results = await asyncio.gather(*steps)
+                auth_result, reputation_result, header_result, attachment_result, intent_result = step_results[:5]
+                if ai_result is None:
+                    ai_result = step_results[5]
+                
+                # Step 6: Calculate combined threat score (without AI if it did not answer)
+                ai_available = ai_result is not None
+                if not ai_available:
+                    ai_result = self._unavailable_prediction()
+                combined_threat_score = self._calculate_combined_threat_score(
+                    auth_result, reputation_result, header_result, attachment_result,
+                    ai_result if ai_available else None
+                )
+                
+                # Step 7: Apply zero-trust policies
+                action = self._apply_zero_trust_policies(email_data, combined_threat_score, sender_domain)
             
-            # Step 9: Apply zero-trust policies
-            action = self._apply_zero_trust_policies(email_data, combined_threat_score)
+            # Labels repeat across emails; share one string object per label
+            threat_type = sys.intern(ai_result.threat_type)
+            indicators = tuple(map(sys.intern, ai_result.indicators))
+            confidence = ai_result.confidence
+            model_version = ai_result.model_version
             
-            # Step 10: Sandbox analysis if needed
+            # Step 8: Sandbox analysis if needed
             sandbox_result = None
             if action == EmailAction.SANDBOX and email_data.get('attachments'):
                 sandbox_result = await self._sandbox_attachments(email_data['attachments'])
             
-            # Step 11: Update email record with results
-            await self._update_email_record(email_record, combined_threat_score, action, sandbox_result)
+            # Step 9: Store email with its results in one transaction
+            email_record = await self._store_email(
+                email_data, combined_threat_score, ai_result, action, sandbox_result
+            )
+            email_id = str(email_record.id)
+            
+            # Step 10: Link rewriting and analysis (tracking needs the stored email id)
+            link_result = await self._rewrite_links(email_data, email_id)
             
-            # Step 12: Take action based on result
+            # Step 11: Take action based on result
             await self._execute_action(email_record, action, combined_threat_score, sandbox_result)
             
             # Calculate processing time
-            processing_time = (datetime.utcnow() - start_time).total_seconds()
+            processing_time = time.perf_counter() - start_time
             
             # Update statistics
             self._update_statistics(processing_time, action, combined_threat_score)
             
             # Phase 1: Log training data sample (with intent labeling)
             try:
-                if self.training_logger:
+                # Policy-decided emails carry no model output worth training on
+                if self.training_logger and intent_result is not None:
                     self.training_logger.log_email_sample(
                         email_input=email_data,
                         ai_output={
-                            'threat_type': ai_result.threat_type,
-                            'confidence': ai_result.confidence,
+                            'threat_type': threat_type,
+                            'confidence': confidence,
                             'threat_score': ai_result.threat_score,
-                            'indicators': ai_result.indicators,
-                            'model_version': ai_result.model_version,
+                            'indicators': indicators,
+                            'model_version': model_version,
                             'intent': intent_result.get('intent'),
                             'intent_confidence': intent_result.get('confidence'),
                             'intent_indicators': intent_result.get('indicators'),
@@ -253,45 +469,66 @@ class EmailGatewayService:
                 logger.error("Training log failed", error=str(e))
 
             result = EmailProcessingResult(
-                email_id=str(email_record.id),
+                email_id=email_id,
                 action=action,
                 threat_score=combined_threat_score,
-                threat_type=ai_result.threat_type,
-                confidence=ai_result.confidence,
-                indicators=ai_result.indicators,
+                threat_type=threat_type,
+                confidence=confidence,
+                indicators=indicators,
                 processing_time=processing_time,
                 sandbox_result=sandbox_result,
                 ai_analysis={
-                    'threat_type': ai_result.threat_type,
-                    'confidence': ai_result.confidence,
-                    'indicators': ai_result.indicators,
-                    'model_version': ai_result.model_version,
+                    'threat_type': threat_type,
+                    'confidence': confidence,
+                    'indicators': indicators,
+                    'model_version': model_version,
                     'authentication_score': auth_result.authentication_score if auth_result else 0.0,
                     'reputation_score': reputation_result.get('score', 0.0) if reputation_result else 0.0,
                     'header_risk': header_result.risk_score if header_result else 0.0
                 }
             )
             
-            logger.info(f"Email processed: {action.value} (threat_score: {combined_threat_score:.3f})")
+            if self.stats.emails_processed % self.log_sample_rate == 0:
+                logger.info(
+                    "Email processed",
+                    sampled_every=self.log_sample_rate,
+                    action=action.value,
+                    threat_score=combined_threat_score,
+                    processing_time=processing_time
+                )
             return result
             
         except Exception as e:
             logger.error(f"Error processing email: {e}")
-            return EmailProcessingResult(
-                email_id="error",
-                action=EmailAction.QUARANTINE,
-                threat_score=1.0,
-                threat_type="error",
-                confidence=1.0,
-                indicators=["processing_error"],
-                processing_time=(datetime.utcnow() - start_time).total_seconds()
-            )
+            return self._error_result(time.perf_counter() - start_time)
     
-    async def _store_email(self, email_data: Dict[str, Any]) -> Email:
-        """Store email in database"""
+    async def _run_step(self, name: str, coro, default=None):
+        """Await one pipeline step, bounded by the step timeout; failures yield default"""
+        try:
+            return await asyncio.wait_for(coro, timeout=self.step_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Pipeline step timed out", step=name, timeout=self.step_timeout)
+            return default
+        except Exception as e:
+            logger.error("Pipeline step failed", step=name, error=str(e))
+            return default
+    
+    def _error_result(self, processing_time: float) -> EmailProcessingResult:
+        """Fail-closed result for an email whose processing raised"""
+        return EmailProcessingResult(
+            email_id="error",
+            action=EmailAction.QUARANTINE,
+            threat_score=1.0,
+            threat_type="error",
+            confidence=1.0,
+            indicators=("processing_error",),
+            processing_time=processing_time
+        )
+    
+    async def _store_email(self, email_data: Dict[str, Any], threat_score: float, ai_result,
+                           action: EmailAction, sandbox_result: Optional[Dict[str, Any]]) -> Email:
+        """Store email with its analysis results and attachments via the batched writer"""
         try:
-            db = next(get_db())
-            
             email_record = Email(
                 message_id=email_data.get('message_id', ''),
                 subject=email_data.get('subject', ''),
@@ -300,31 +537,104 @@ class EmailGatewayService:
                 content_type=email_data.get('content_type', 'text/plain'),
                 body_text=email_data.get('body_text', ''),
                 body_html=email_data.get('body_html', ''),
-                received_at=datetime.utcnow()
+                received_at=datetime.utcnow(),
+                threat_score=threat_score,
+                is_suspicious=threat_score > 0.5,
+                ai_verdict=ai_result.threat_type,
+                # JSON column: SQLAlchemy serializes the dict on write
+                static_scan_result={
+                    'action': action.value,
+                    'confidence': ai_result.confidence,
+                    'indicators': ai_result.indicators,
+                    'sandbox_result': sandbox_result
+                }
             )
             
-            db.add(email_record)
-            db.commit()
-            db.refresh(email_record)
-            
-            # Store attachments if any
-            for attachment_data in email_data.get('attachments', []):
-                attachment = EmailAttachment(
-                    email_id=email_record.id,
-                    filename=attachment_data.get('filename', ''),
-                    content_type=attachment_data.get('mime_type', ''),
-                    file_size=attachment_data.get('size', 0),
-                    file_path=None  # Will be set when file is stored
-                )
-                db.add(attachment)
+            attachments = [
+                {
+                    'filename': attachment_data.get('filename', ''),
+                    'content_type': attachment_data.get('mime_type', ''),
+                    'file_size': attachment_data.get('size', 0)
+                }
+                for attachment_data in email_data.get('attachments', [])
+            ]
+            
+            # Queue for the next batched insert and wait until it is committed
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._store_queue.append((email_record, attachments, future))
             
-            db.commit()
+            if len(self._store_queue) >= self.db_batch_size:
+                self._flush_store_queue()
+            elif self._store_timer is None:
+                self._store_timer = loop.call_later(self.db_batch_wait, self._flush_store_queue)
+            
+            await future
             return email_record
             
         except Exception as e:
             logger.error(f"Error storing email: {e}")
             raise
     
+    def _flush_store_queue(self):
+        """Hand every queued email insert to one write batch"""
+        if self._store_timer is not None:
+            self._store_timer.cancel()
+            self._store_timer = None
+        
+        batch, self._store_queue = self._store_queue, []
+        if batch:
+            task = asyncio.create_task(self._run_store_batch(batch))
+            self._store_batches.add(task)
+            task.add_done_callback(self._store_batches.discard)
+    
+    async def _run_store_batch(self, batch: List[Tuple[Email, List[Dict[str, Any]], asyncio.Future]]):
+        """Insert a batch in one transaction and resolve each waiter"""
+        try:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(
+                self._get_db_pool(), self._insert_emails, [(record, attachments) for record, attachments, _ in batch]
+            )
+        except Exception as e:
+            if len(batch) > 1:
+                # One bad row (e.g. a duplicate message_id) must not fail its neighbours
+                logger.warning("Batched email insert failed, retrying individually", size=len(batch), error=str(e))
+                for record, _, _ in batch:
+                    record.id = None
+                await asyncio.gather(*(self._run_store_batch([entry]) for entry in batch))
+                return
+            
+            _, _, future = batch[0]
+            if not future.done():
+                future.set_exception(e)
+            return
+        
+        for _, _, future in batch:
+            if not future.done():
+                future.set_result(None)
+    
+    def _get_db_pool(self) -> ThreadPoolExecutor:
+        """Return the DB thread pool, creating it if it doesn't exist or was shut down by stop()"""
+        if self._db_pool is None:
+            self._db_pool = ThreadPoolExecutor(max_workers=self.db_workers, thread_name_prefix='email-db')
+        return self._db_pool
+    
+    def _insert_emails(self, entries: List[Tuple[Email, List[Dict[str, Any]]]]):
+        """Insert emails and their attachments in a single transaction"""
+        # begin() commits on success and rolls back if any statement fails
+        with SessionLocal(expire_on_commit=False) as db, db.begin():
+            db.add_all([record for record, _ in entries])
+            db.flush()  # Populates every record id before the attachments
+            
+            # All attachments of the batch as one multi-row INSERT
+            rows = [
+                dict(attachment, email_id=record.id)
+                for record, attachments in entries
+                for attachment in attachments
+            ]
+            if rows:
+                db.execute(insert(EmailAttachment), rows)
+    
     async def _validate_email_authentication(self, email_data: Dict[str, Any]):
         """Validate email authentication (DMARC, DKIM, SPF)"""
         try:
@@ -335,11 +645,37 @@ class EmailGatewayService:
                 'Received': f'from {email_data.get("source_ip", "unknown")} by privik-gateway'
             }
             
-            return await email_auth_service.validate_email_authentication(
+            # Carry the message's DKIM signature and raw body so the bh= check runs
+            raw_body = email_data.get('raw_body')
+            for name, value in email_data.get('headers', {}).items():
+                if name.lower() == 'dkim-signature':
+                    headers['DKIM-Signature'] = value
+                    break
+            
+            # Without a signed body the verdict is fully determined by these inputs,
+            # so repeat senders skip the SPF/DKIM/DMARC round-trips while fresh
+            cache_key = None
+            if raw_body is None or 'DKIM-Signature' not in headers:
+                cache_key = (email_data.get('sender', ''), email_data.get('source_ip'), email_data.get('sender_domain'))
+            now = time.monotonic()
+            cached = self._auth_cache.get(cache_key) if cache_key is not None else None
+            if cached is not None and cached[0] > now:
+                self._auth_cache.move_to_end(cache_key)
+                return cached[1]
+            
+            result = await email_auth_service.validate_email_authentication(
                 headers, 
                 email_data.get('source_ip', '127.0.0.1'),
-                email_data.get('sender_domain', 'unknown.com')
+                email_data.get('sender_domain', 'unknown.com'),
+                email_body=raw_body
             )
+            
+            if result is not None and cache_key is not None:
+                self._auth_cache[cache_key] = (now + self._auth_cache_ttl, result)
+                self._auth_cache.move_to_end(cache_key)
+                if len(self._auth_cache) > self._auth_cache_size:
+                    self._auth_cache.popitem(last=False)
+            return result
         except Exception as e:
             logger.error(f"Error validating email authentication: {e}")
             return None
@@ -399,72 +735,72 @@ class EmailGatewayService:
             if not self.attachment_validator or not email_data.get('attachments'):
                 return []
             
-            validation_results = []
-            for attachment in email_data['attachments']:
-                filename = attachment.get('filename', 'unknown')
-                content = attachment.get('content', b'')
-                mime_type = attachment.get('mime_type')
-                
-                result = await self.attachment_validator.validate_attachment(
-                    filename, content, mime_type
+            results = await asyncio.gather(*(
+                self.attachment_validator.validate_attachment(
+                    attachment.get('filename', 'unknown'),
+                    attachment.get('content', b''),
+                    attachment.get('mime_type'),
+                    self._attachment_sha256(attachment)
                 )
-                validation_results.append(result)
+                for attachment in email_data['attachments']
+            ), return_exceptions=True)
+            
+            # A failed validation contributes nothing to the score rather than discarding the others
+            validation_results = []
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.warning("Attachment validation failed", error=str(result))
+                else:
+                    validation_results.append(result)
             
             return validation_results
         except Exception as e:
             logger.error(f"Error validating attachments: {e}")
             return []
     
+    def _attachment_sha256(self, attachment: Dict[str, Any]) -> str:
+        """SHA-256 hex digest of an attachment, computed once and kept on the attachment"""
+        digest = attachment.get('sha256')
+        if digest is None:
+            digest = attachment['sha256'] = hashlib.sha256(attachment.get('content') or b'').hexdigest()
+        return digest
+    
     def _calculate_combined_threat_score(self, auth_result, reputation_result, header_result, attachment_result, ai_result):
         """Calculate combined threat score from all analysis results"""
         try:
-            scores = []
-            weights = []
+            weighted_total = 0.0
+            total_weight = 0.0
             
-            # Authentication score (weight: 0.2)
+            # Authentication score
             if auth_result:
-                scores.append(1.0 - auth_result.authentication_score)  # Convert to threat score
-                weights.append(0.2)
+                weighted_total += _COMPONENT_WEIGHT * (1.0 - auth_result.authentication_score)  # Convert to threat score
+                total_weight += _COMPONENT_WEIGHT
             
-            # Reputation score (weight: 0.2)
+            # Reputation score
             if reputation_result:
-                scores.append(1.0 - reputation_result.get('score', 0.5))
-                weights.append(0.2)
+                weighted_total += _COMPONENT_WEIGHT * (1.0 - reputation_result.get('score', 0.5))
+                total_weight += _COMPONENT_WEIGHT
             
-            # Header analysis score (weight: 0.2)
+            # Header analysis score
             if header_result:
-                scores.append(header_result.risk_score)
-                weights.append(0.2)
+                weighted_total += _COMPONENT_WEIGHT * header_result.risk_score
+                total_weight += _COMPONENT_WEIGHT
             
-            # Attachment validation score (weight: 0.2)
+            # Attachment validation score, highest threat wins; unknown levels count as critical
             if attachment_result:
-                attachment_scores = []
-                for result in attachment_result:
-                    if result.risk_level.value == 'safe':
-                        attachment_scores.append(0.0)
-                    elif result.risk_level.value == 'low':
-                        attachment_scores.append(0.2)
-                    elif result.risk_level.value == 'medium':
-                        attachment_scores.append(0.5)
-                    elif result.risk_level.value == 'high':
-                        attachment_scores.append(0.8)
-                    else:  # critical
-                        attachment_scores.append(1.0)
-                
-                if attachment_scores:
-                    scores.append(max(attachment_scores))  # Use highest threat score
-                    weights.append(0.2)
+                weighted_total += _COMPONENT_WEIGHT * max(
+                    _ATTACHMENT_RISK_SCORES.get(result.risk_level, 1.0) for result in attachment_result
+                )
+                total_weight += _COMPONENT_WEIGHT
             
-            # AI threat detection score (weight: 0.2)
+            # AI threat detection score
             if ai_result:
-                scores.append(ai_result.threat_score)
-                weights.append(0.2)
+                weighted_total += _COMPONENT_WEIGHT * ai_result.threat_score
+                total_weight += _COMPONENT_WEIGHT
             
             # Calculate weighted average
-            if scores and weights:
-                total_weight = sum(weights)
-                weighted_score = sum(score * weight for score, weight in zip(scores, weights)) / total_weight
-                return min(1.0, max(0.0, weighted_score))
+            if total_weight:
+                return min(1.0, max(0.0, weighted_total / total_weight))
             else:
                 return 0.5  # Default neutral score
             
@@ -472,153 +808,172 @@ class EmailGatewayService:
             logger.error(f"Error calculating combined threat score: {e}")
             return 0.5
     
-    def _apply_zero_trust_policies(self, email_data: Dict[str, Any], threat_score: float) -> EmailAction:
+    def _scan_keywords(self, text: str) -> List[str]:
+        """Return the suspicious keywords found in text in a single pass"""
+        if not self._keyword_pattern or not text:
+            return []
+        # Keywords are stored lower-cased; fold the text once instead of matching case-insensitively
+        return list(dict.fromkeys(self._keyword_pattern.findall(text.lower())))
+    
+    def _apply_zero_trust_policies(self, email_data: Dict[str, Any], threat_score: float,
+                                   sender_domain: Optional[str] = None) -> EmailAction:
         """Apply zero-trust policies to determine email action"""
         try:
-            # Check whitelist/blacklist domains
-            sender_domain = self._extract_domain(email_data.get('sender', ''))
-            
-            if sender_domain in self.zero_trust_policies['blacklist_domains']:
-                return EmailAction.BLOCK
+            if sender_domain is None:
+                sender_domain = self._extract_domain(email_data.get('sender', ''))
             
-            if sender_domain in self.zero_trust_policies['whitelist_domains']:
-                return EmailAction.ALLOW
+            action = self._evaluate_policy(sender_domain, threat_score)
             
-            # Check threat score thresholds
-            threat_score = threat_score
-            
-            if threat_score >= self.zero_trust_policies['threat_thresholds']['block']:
-                return EmailAction.BLOCK
-            elif threat_score >= self.zero_trust_policies['threat_thresholds']['quarantine']:
-                return EmailAction.QUARANTINE
-            elif threat_score >= self.zero_trust_policies['threat_thresholds']['sandbox']:
-                return EmailAction.SANDBOX
-            else:
-                return EmailAction.ALLOW
+            # Low-scoring mail that still uses suspicious wording is not trusted outright
+            if action == EmailAction.ALLOW and sender_domain not in self._whitelist:
+                text = f"{email_data.get('subject', '')}\n{email_data.get('body_text', '')}"
+                if self._scan_keywords(text):
+                    return EmailAction.SANDBOX
+            return action
                 
         except Exception as e:
             logger.error(f"Error applying zero-trust policies: {e}")
             return EmailAction.QUARANTINE
     
+    def _evaluate_policy(self, sender_domain: str, threat_score: float) -> EmailAction:
+        """Map a sender domain and threat score to an action"""
+        # Check whitelist/blacklist domains
+        listed_action = self._domain_list_action(sender_domain)
+        if listed_action is not None:
+            return listed_action
+        
+        # Check threat score thresholds
+        return self._threshold_actions[bisect.bisect_right(self._threshold_scores, threat_score)]
+    
+    def _domain_list_action(self, sender_domain: str) -> Optional[EmailAction]:
+        """Return the fixed action for blacklisted/whitelisted domains, None otherwise"""
+        if sender_domain in self._blacklist:
+            return EmailAction.BLOCK
+        if sender_domain in self._whitelist:
+            return EmailAction.ALLOW
+        return None
+    
+    def _domain_list_prediction(self, action: EmailAction) -> ThreatPrediction:
+        """Stand-in prediction recorded for emails decided by the domain lists"""
+        blocked = action == EmailAction.BLOCK
+        return ThreatPrediction(
+            threat_type='blacklisted' if blocked else 'whitelisted',
+            confidence=1.0,
+            threat_score=1.0 if blocked else 0.0,
+            indicators=['blacklisted_domain' if blocked else 'whitelisted_domain'],
+            model_version='policy',
+            prediction_time=datetime.utcnow()
+        )
+    
+    def _unavailable_prediction(self) -> ThreatPrediction:
+        """Placeholder prediction when AI threat detection failed or timed out"""
+        return ThreatPrediction(
+            threat_type='unknown',
+            confidence=0.0,
+            threat_score=0.0,
+            indicators=['prediction_unavailable'],
+            model_version='error',
+            prediction_time=datetime.utcnow()
+        )
+    
     def _extract_domain(self, email_address: str) -> str:
         """Extract domain from email address"""
-        try:
-            if '@' in email_address:
-                return email_address.split('@')[1].lower()
-            return email_address.lower()
-        except:
-            return email_address.lower()
+        return _sender_domain(email_address)
     
     async def _sandbox_attachments(self, attachments: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Sandbox email attachments"""
+        """Sandbox email attachments concurrently"""
         try:
-            sandbox_results = {}
-            
-            for attachment in attachments:
-                filename = attachment.get('filename', '')
-                if filename:
-                    # For MVP, simulate sandbox analysis
-                    sandbox_results[filename] = {
-                        'verdict': 'safe',
-                        'threat_score': 0.1,
-                        'indicators': [],
-                        'analysis_time': 2.5
-                    }
-            
-            return sandbox_results
+            named = [attachment for attachment in attachments if attachment.get('filename')]
+            results = await asyncio.gather(*(self._sandbox_one(attachment) for attachment in named))
+            return {attachment['filename']: result for attachment, result in zip(named, results)}
             
         except Exception as e:
             logger.error(f"Error sandboxing attachments: {e}")
             return {}
     
-    async def _update_email_record(self, email_record: Email, ai_result, action: EmailAction, sandbox_result: Optional[Dict[str, Any]]):
-        """Update email record with analysis results"""
-        try:
-            db = next(get_db())
-            
-            email_record.threat_score = ai_result.threat_score
-            email_record.is_suspicious = ai_result.threat_score > 0.5
-            email_record.ai_verdict = ai_result.threat_type
-            email_record.static_scan_result = json.dumps({
-                'action': action.value,
-                'confidence': ai_result.confidence,
-                'indicators': ai_result.indicators,
-                'sandbox_result': sandbox_result
-            })
-            
-            db.commit()
-            
-        except Exception as e:
-            logger.error(f"Error updating email record: {e}")
+    async def _sandbox_one(self, attachment: Dict[str, Any]) -> Dict[str, Any]:
+        """Sandbox a single attachment"""
+        async with self._sandbox_semaphore:
+            # For MVP, simulate sandbox analysis
+            return {
+                'sha256': self._attachment_sha256(attachment),
+                'verdict': 'safe',
+                'threat_score': 0.1,
+                'indicators': [],
+                'analysis_time': 2.5
+            }
     
-    async def _execute_action(self, email_record: Email, action: EmailAction, ai_result, sandbox_result: Optional[Dict[str, Any]]):
+    async def _execute_action(self, email_record: Email, action: EmailAction, threat_score: float, sandbox_result: Optional[Dict[str, Any]]):
         """Execute the determined action for the email"""
         try:
             if action == EmailAction.BLOCK:
-                await self._block_email(email_record, ai_result)
+                await self._block_email(email_record, threat_score)
             elif action == EmailAction.QUARANTINE:
-                await self._quarantine_email(email_record, ai_result)
+                await self._quarantine_email(email_record, threat_score)
             elif action == EmailAction.SANDBOX:
-                await self._sandbox_email(email_record, ai_result, sandbox_result)
+                await self._sandbox_email(email_record, threat_score, sandbox_result)
             else:  # ALLOW
-                await self._allow_email(email_record, ai_result)
+                await self._allow_email(email_record, threat_score)
                 
         except Exception as e:
             logger.error(f"Error executing action {action.value}: {e}")
     
-    async def _block_email(self, email_record: Email, ai_result):
+    async def _block_email(self, email_record: Email, threat_score: float):
         """Block email and notify security team"""
-        logger.warning(f"BLOCKED email: {email_record.subject} (threat_score: {ai_result.threat_score})")
+        logger.warning("BLOCKED email", subject=email_record.subject, threat_score=threat_score)
         # TODO: Implement email blocking logic
         # TODO: Send alert to security team
     
-    async def _quarantine_email(self, email_record: Email, ai_result):
+    async def _quarantine_email(self, email_record: Email, threat_score: float):
         """Quarantine email for manual review"""
-        logger.warning(f"QUARANTINED email: {email_record.subject} (threat_score: {ai_result.threat_score})")
+        logger.warning("QUARANTINED email", subject=email_record.subject, threat_score=threat_score)
         # TODO: Implement email quarantine logic
         # TODO: Send notification to security team
     
-    async def _sandbox_email(self, email_record: Email, ai_result, sandbox_result: Optional[Dict[str, Any]]):
+    async def _sandbox_email(self, email_record: Email, threat_score: float, sandbox_result: Optional[Dict[str, Any]]):
         """Sandbox email for further analysis"""
-        logger.info(f"SANDBOXED email: {email_record.subject} (threat_score: {ai_result.threat_score})")
+        logger.debug("SANDBOXED email", subject=email_record.subject, threat_score=threat_score)
         # TODO: Implement email sandboxing logic
         # TODO: Schedule for further analysis
     
-    async def _allow_email(self, email_record: Email, ai_result):
+    async def _allow_email(self, email_record: Email, threat_score: float):
         """Allow email to proceed"""
-        logger.info(f"ALLOWED email: {email_record.subject} (threat_score: {ai_result.threat_score})")
+        logger.debug("ALLOWED email", subject=email_record.subject, threat_score=threat_score)
         # TODO: Implement email delivery logic
     
     def _update_statistics(self, processing_time: float, action: EmailAction, threat_score: float):
         """Update processing statistics"""
-        self.stats['emails_processed'] += 1
+        # No await in here: concurrent pipelines on the event loop cannot interleave, so no lock
+        stats = self.stats
+        stats.emails_processed += 1
         
         if threat_score > 0.5:
-            self.stats['threats_detected'] += 1
+            stats.threats_detected += 1
         
         if action == EmailAction.QUARANTINE:
-            self.stats['emails_quarantined'] += 1
+            stats.emails_quarantined += 1
         elif action == EmailAction.BLOCK:
-            self.stats['emails_blocked'] += 1
+            stats.emails_blocked += 1
         
-        # Update average processing time
-        current_avg = self.stats['processing_time_avg']
-        total_emails = self.stats['emails_processed']
-        self.stats['processing_time_avg'] = ((current_avg * (total_emails - 1)) + processing_time) / total_emails
+        # Welford update of the mean processing time: bounded magnitude, no growing total
+        stats.processing_time_avg += (processing_time - stats.processing_time_avg) / stats.emails_processed
+    
+    async def _collect_batch(self) -> List[Dict[str, Any]]:
+        """Wait for the next email, then drain the queue until the batch is full or the wait expires"""
+        return await self.processing_queue.get_batch(
+            self.processing_batch_size, self.processing_batch_wait, timeout=1.0
+        )
     
     async def _process_email_queue(self):
-        """Process emails from the queue"""
+        """Process emails from the queue in batches"""
         try:
             while self.is_running:
                 try:
-                    # Get email from queue (with timeout)
-                    email_data = await asyncio.wait_for(
-                        self.processing_queue.get(), 
-                        timeout=1.0
-                    )
+                    # Get a batch of emails from queue (with timeout)
+                    batch = await self._collect_batch()
                     
-                    # Process email
-                    await self.process_email(email_data)
+                    # Process the batch concurrently
+                    await self.process_email_batch(batch)
                     
                 except asyncio.TimeoutError:
                     # No emails in queue, continue
@@ -635,19 +990,22 @@ class EmailGatewayService:
             while self.is_running:
                 await asyncio.sleep(300)  # Report every 5 minutes
                 
-                logger.info("Email Gateway Statistics", **self.stats)
+                logger.info("Email Gateway Statistics", **asdict(self.stats))
                 
         except Exception as e:
             logger.error(f"Error reporting statistics: {e}")
     
     async def get_statistics(self) -> Dict[str, Any]:
         """Get current processing statistics"""
-        return self.stats.copy()
+        stats = asdict(self.stats)
+        stats['queue_size'] = self.processing_queue.qsize()
+        return stats
     
     async def update_zero_trust_policies(self, policies: Dict[str, Any]):
         """Update zero-trust policies"""
         try:
             self.zero_trust_policies.update(policies)
+            self._compile_policies()
             logger.info("Zero-trust policies updated")
         except Exception as e:
             logger.error(f"Error updating zero-trust policies: {e}")
@@ -17,6 +17,7 @@ import ssl
 from datetime import datetime
 import json
 import re
+import hashlib
 from email.header import decode_header
 from email.utils import parseaddr
 
@@ -367,6 +368,7 @@ class SMTPGateway:
                 'body_text': self._extract_text_content(email_message),
                 'body_html': self._extract_html_content(email_message),
                 'headers': dict(email_message.items()),
+                'raw_body': self._extract_raw_body(email_data),
                 'attachments': self._extract_attachments(email_message),
                 'source': 'smtp_gateway'
             }
@@ -404,6 +406,11 @@ class SMTPGateway:
                 reason="Processing error"
             )
     
+    def _extract_raw_body(self, email_data: str) -> str:
+        """Return the message body exactly as received, for the DKIM body hash"""
+        parts = re.split(r'\r?\n\r?\n', email_data, maxsplit=1)
+        return parts[1] if len(parts) == 2 else ""
+    
     def _extract_text_content(self, email_message) -> str:
         """Extract text content from email"""
         try:
@@ -439,11 +446,13 @@ class SMTPGateway:
             if email_message.is_multipart():
                 for part in email_message.walk():
                     if part.get_filename():
+                        payload = part.get_payload(decode=True) or b''
                         attachments.append({
                             'filename': part.get_filename(),
                             'mime_type': part.get_content_type(),
-                            'size': len(part.get_payload(decode=True) or b''),
-                            'content': part.get_payload(decode=True)
+                            'size': len(payload),
+                            'content': payload,
+                            'sha256': hashlib.sha256(payload).hexdigest()
                         })
             return attachments
         except Exception:
@@ -0,0 +1,9 @@
+"""
+Compatibility Utilities
+Shims for features that differ across the supported Python versions
+"""
+
+import sys
+
+# dataclass(slots=True) needs Python 3.10+; CI still covers 3.9
+DATACLASS_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
@@ -0,0 +1,157 @@
+"""
+Unit tests for Email Authentication Service
+"""
+
+import asyncio
+import base64
+import hashlib
+import pytest
+from unittest.mock import AsyncMock, patch
+from app.services.email_authentication import EmailAuthenticationService, AuthenticationResult
+
+
+def _fake_dns(records):
+    """Resolver stand-in answering from a {(domain, record_type): [answers]} table."""
+    async def resolve(domain, record_type):
+        return list(records.get((domain, record_type), []))
+    return resolve
+
+
+class TestSPFValidation:
+    """Test cases for SPF evaluation"""
+    
+    @pytest.fixture
+    def auth_service(self):
+        """Create EmailAuthenticationService instance for testing."""
+        return EmailAuthenticationService()
+    
+    @pytest.mark.asyncio
+    async def test_include_is_evaluated_recursively(self, auth_service):
+        """Test that a match inside an included record passes the outer check."""
+        records = {
+            ("example.com", "TXT"): ["v=spf1 include:_spf.example.net -all"],
+            ("_spf.example.net", "TXT"): ["v=spf1 ip4:192.0.2.10 -all"],
+        }
+        with patch.object(auth_service, "_resolve_dns_records", side_effect=_fake_dns(records)):
+            result = await auth_service._validate_spf("192.0.2.10", "example.com")
+        
+        assert result.result == AuthenticationResult.PASS
+    
+    @pytest.mark.asyncio
+    async def test_lookup_limit_exceeded(self, auth_service):
+        """Test that more than ten DNS-querying mechanisms is a permerror."""
+        hosts = " ".join(f"a:host{i}.example.com" for i in range(11))
+        records = {("example.com", "TXT"): [f"v=spf1 {hosts} -all"]}
+        with patch.object(auth_service, "_resolve_dns_records", side_effect=_fake_dns(records)):
+            result = await auth_service._validate_spf("192.0.2.10", "example.com")
+        
+        assert result.result == AuthenticationResult.PERMERROR
+    
+    @pytest.mark.asyncio
+    async def test_lookup_limit_is_shared_across_includes(self, auth_service):
+        """Test that an include loop exhausts the budget instead of recursing forever."""
+        records = {("loop.example.com", "TXT"): ["v=spf1 include:loop.example.com -all"]}
+        with patch.object(auth_service, "_resolve_dns_records", side_effect=_fake_dns(records)):
+            result = await auth_service._validate_spf("192.0.2.10", "loop.example.com")
+        
+        assert result.result == AuthenticationResult.PERMERROR
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("record, expected", [
+        ("v=spf1 ip4:192.0.2.10 -all", AuthenticationResult.PASS),
+        ("v=spf1 +ip4:192.0.2.10 -all", AuthenticationResult.PASS),
+        ("v=spf1 -ip4:192.0.2.10 +all", AuthenticationResult.FAIL),
+        ("v=spf1 ~ip4:192.0.2.10 +all", AuthenticationResult.NEUTRAL),
+        ("v=spf1 ?ip4:192.0.2.10 +all", AuthenticationResult.NEUTRAL),
+        ("v=spf1 ip4:198.51.100.1 -all", AuthenticationResult.FAIL),
+        ("v=spf1 ip4:198.51.100.1", AuthenticationResult.NEUTRAL),
+    ])
+    async def test_qualifiers(self, auth_service, record, expected):
+        """Test that the first matching mechanism's qualifier decides the result."""
+        records = {("example.com", "TXT"): [record]}
+        with patch.object(auth_service, "_resolve_dns_records", side_effect=_fake_dns(records)):
+            result = await auth_service._validate_spf("192.0.2.10", "example.com")
+        
+        assert result.result == expected
+
+
+class TestDKIMBodyHash:
+    """Test cases for the DKIM bh= check"""
+    
+    @pytest.fixture
+    def auth_service(self):
+        """Create EmailAuthenticationService instance for testing."""
+        return EmailAuthenticationService()
+    
+    @staticmethod
+    def _signature(canonical_body: bytes, canonicalization: str = "relaxed/relaxed") -> str:
+        body_hash = base64.b64encode(hashlib.sha256(canonical_body).digest()).decode("ascii")
+        return f"v=1; a=rsa-sha256; c={canonicalization}; d=example.com; s=sel; bh={body_hash}; b=c2ln"
+    
+    @pytest.mark.asyncio
+    async def test_matching_body_hash_passes(self, auth_service):
+        """Test that a body matching bh= under relaxed canonicalization verifies."""
+        signature = self._signature(b"Hello world\r\n")
+        body = b"Hello   world  \r\n\r\n\r\n"
+        
+        assert await auth_service._verify_dkim_signature(signature, {}, body, "p=KEY") is True
+    
+    @pytest.mark.asyncio
+    async def test_simple_canonicalization_keeps_whitespace(self, auth_service):
+        """Test that simple canonicalization does not fold whitespace."""
+        signature = self._signature(b"Hello world\r\n", "simple/simple")
+        
+        assert await auth_service._verify_dkim_signature(signature, {}, b"Hello world\n\n", "p=KEY") is True
+        assert await auth_service._verify_dkim_signature(signature, {}, b"Hello   world\r\n", "p=KEY") is False
+    
+    @pytest.mark.asyncio
+    async def test_tampered_body_fails(self, auth_service):
+        """Test that a modified body fails DKIM validation."""
+        signature = self._signature(b"Hello world\r\n")
+        
+        with patch.object(auth_service, "_query_dkim_public_key", new=AsyncMock(return_value="p=KEY")):
+            result = await auth_service._validate_dkim({"DKIM-Signature": signature}, b"Goodbye world\r\n")
+        
+        assert result.result == AuthenticationResult.FAIL
+    
+    @pytest.mark.asyncio
+    async def test_validate_accepts_str_body(self, auth_service):
+        """Test that a str body is encoded and hashed like the equivalent bytes."""
+        signature = self._signature(b"Hello world\r\n")
+        
+        with patch.object(auth_service, "_query_dkim_public_key", new=AsyncMock(return_value="p=KEY")), \
+                patch.object(auth_service, "_resolve_dns_records", side_effect=_fake_dns({})):
+            result = await auth_service.validate_email_authentication(
+                {"DKIM-Signature": signature}, "192.0.2.10", "example.com", email_body="Hello world\r\n"
+            )
+        
+        assert result.dkim.result == AuthenticationResult.PASS
+
+
+class TestBatchValidation:
+    """Test cases for bulk authentication"""
+    
+    @pytest.mark.asyncio
+    async def test_validate_batch_bounds_concurrency_and_keeps_order(self):
+        """Test that validate_batch caps in-flight validations and returns results in input order."""
+        auth_service = EmailAuthenticationService()
+        in_flight = 0
+        peak = 0
+        
+        async def validate(email_headers, sender_ip, sender_domain, email_body=None):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return sender_domain
+        
+        items = [
+            {"email_headers": {}, "sender_ip": "192.0.2.10", "sender_domain": f"d{i}.example.com"}
+            for i in range(10)
+        ]
+        with patch.object(auth_service, "validate_email_authentication", side_effect=validate):
+            results = await auth_service.validate_batch(items, concurrency=3)
+        
+        assert results == [f"d{i}.example.com" for i in range(10)]
+        assert peak == 3
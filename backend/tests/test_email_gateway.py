@@ -0,0 +1,125 @@
+"""
+Unit tests for Email Gateway link rewriting and delivery
+"""
+
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+from app.services.email_gateway import EmailGateway
+
+
+def _fake_rewrite(original_url, email_data, tracking_id=None, now=None):
+    """Deterministic stand-in for _create_rewritten_link."""
+    return f"https://links.privik.com/t?u={original_url}"
+
+
+class TestLinkRewriting:
+    """Test cases for EmailGateway link rewriting"""
+    
+    @pytest.mark.asyncio
+    async def test_prefix_urls_rewritten_independently(self):
+        """Test that a URL which prefixes another does not mangle the longer one."""
+        gateway = EmailGateway({})
+        body = "See https://a.com/x and https://a.com/x/y today"
+        links = gateway._extract_links(body)
+        
+        with patch.object(gateway, "_create_rewritten_link", side_effect=_fake_rewrite):
+            result = await gateway._rewrite_links({"body_text": body}, links)
+        
+        assert result["body_text"] == (
+            "See https://links.privik.com/t?u=https://a.com/x "
+            "and https://links.privik.com/t?u=https://a.com/x/y today"
+        )
+    
+    @pytest.mark.asyncio
+    async def test_precomputed_spans_match_full_scan(self):
+        """Test that splicing at analysed offsets gives the same body as rescanning."""
+        gateway = EmailGateway({})
+        body = "https://a.com/x then https://a.com/x/y then https://a.com/x"
+        spans = gateway._find_link_spans(body)
+        links = gateway._extract_links(body, spans)
+        
+        with patch.object(gateway, "_create_rewritten_link", side_effect=_fake_rewrite):
+            spliced = await gateway._rewrite_links({"body_text": body}, links, link_spans=spans)
+            scanned = await gateway._rewrite_links({"body_text": body}, links)
+        
+        assert spliced["body_text"] == scanned["body_text"]
+    
+    @pytest.mark.asyncio
+    async def test_html_only_href_attributes_rewritten(self):
+        """Test that only real href values are rewritten in HTML bodies."""
+        gateway = EmailGateway({})
+        body_html = (
+            '<a data-href="https://a.com/data" href="https://a.com/x">https://a.com/x</a>'
+            '<script>var u = "https://a.com/x";</script>'
+        )
+        
+        with patch.object(gateway, "_create_rewritten_link", side_effect=_fake_rewrite):
+            result = await gateway._rewrite_links({"body_html": body_html}, ["https://a.com/x"])
+        
+        assert result["body_html"] == (
+            '<a data-href="https://a.com/data" href="https://links.privik.com/t?u=https://a.com/x">'
+            'https://a.com/x</a><script>var u = "https://a.com/x";</script>'
+        )
+    
+    @pytest.mark.asyncio
+    async def test_html_entity_links_tracked_once(self):
+        """Test that an &amp; URL from an HTML-only body gets a single tracking link."""
+        gateway = EmailGateway({})
+        email_data = {"body_html": '<a href="https://a.com/?p=1&amp;q=2">go</a>'}
+        
+        with patch.object(gateway, "_analyze_content", new=AsyncMock(return_value={})):
+            analysis = await gateway._analyze_email(email_data)
+        result = await gateway._rewrite_links(email_data, analysis["links"])
+        
+        assert analysis["links"] == ["https://a.com/?p=1&q=2"]
+        assert len(gateway.link_tracking) == 1
+        assert "https://a.com/?p=1&amp;q=2" not in result["body_html"]
+    
+    @pytest.mark.asyncio
+    async def test_single_quoted_href_tracked_once(self):
+        """Test that only substituted URLs get tracking records, single-quoted hrefs included."""
+        gateway = EmailGateway({})
+        email_data = {"body_html": "<a href='https://a.com/x'>go</a> visit https://b.com/y"}
+        
+        with patch.object(gateway, "_analyze_content", new=AsyncMock(return_value={})):
+            analysis = await gateway._analyze_email(email_data)
+        result = await gateway._rewrite_links(email_data, analysis["links"])
+        
+        assert analysis["links"] == ["https://a.com/x", "https://b.com/y"]
+        assert [record["original_url"] for record in gateway.link_tracking.values()] == ["https://a.com/x"]
+        assert "href='https://links.privik.com/" in result["body_html"]
+        assert result["body_html"].endswith("visit https://b.com/y")
+
+
+class TestDelivery:
+    """Test cases for batched delivery shutdown"""
+    
+    @pytest.mark.asyncio
+    async def test_cleanup_delivers_partial_and_queued_batches(self):
+        """Test that cleanup flushes the worker's partial batch and anything still queued."""
+        gateway = EmailGateway({"delivery_batch_wait": 10, "delivery_batch_size": 3})
+        gateway.smtp_enabled = True
+        sent = []
+        
+        async def send(messages):
+            sent.append(len(messages))
+            return [{} for _ in messages]
+        
+        gateway._send_pooled = send
+        gateway.sandbox.cleanup = AsyncMock()
+        gateway._delivery_task = asyncio.create_task(gateway._delivery_worker())
+        await asyncio.sleep(0)
+        
+        deliveries = [
+            asyncio.create_task(gateway._deliver_email(
+                {"sender": "a@example.com", "recipients": ["b@example.com"], "subject": str(i)}, {}
+            ))
+            for i in range(5)
+        ]
+        await asyncio.sleep(0.05)
+        await gateway.cleanup()
+        results = await asyncio.wait_for(asyncio.gather(*deliveries), 2)
+        
+        assert [result["status"] for result in results] == ["delivered"] * 5
+        assert sum(sent) == 5
@@ -0,0 +1,86 @@
+"""
+Unit tests for Email Gateway Service policy and batch handling
+"""
+
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+from app.services.email_gateway_service import EmailGatewayService, EmailAction
+
+
+class TestEmailGatewayService:
+    """Test cases for EmailGatewayService"""
+    
+    @pytest.mark.parametrize("address, expected", [
+        ("alice@Example.COM", "example.com"),
+        ("Alice Smith <alice@example.com>", "example.com"),
+        ('"Alice" <alice@example.com> ', "example.com"),
+        ('"a@b.org" <alice@example.com>', "example.com"),
+        ("not-an-address", "not-an-address"),
+        ("", ""),
+    ])
+    def test_extract_domain(self, address, expected):
+        """Test domain extraction from bare and display-name addresses."""
+        service = EmailGatewayService({})
+        
+        assert service._extract_domain(address) == expected
+    
+    @pytest.mark.parametrize("threat_score, expected", [
+        (0.2951, EmailAction.ALLOW),
+        (0.3, EmailAction.SANDBOX),
+        (0.4999, EmailAction.SANDBOX),
+        (0.5, EmailAction.QUARANTINE),
+        (0.795, EmailAction.QUARANTINE),
+        (0.7999, EmailAction.QUARANTINE),
+        (0.8, EmailAction.BLOCK),
+    ])
+    def test_policy_uses_raw_threat_score(self, threat_score, expected):
+        """Test that scores just below a threshold are not rounded up across it."""
+        service = EmailGatewayService({})
+        email_data = {"sender": "alice@example.com", "subject": "", "body_text": ""}
+        
+        assert service._apply_zero_trust_policies(email_data, threat_score) == expected
+    
+    @pytest.mark.asyncio
+    async def test_batch_failure_is_isolated_and_fails_closed(self):
+        """Test that one email raising quarantines only that email."""
+        service = EmailGatewayService({})
+        service.ai_threat_detection = Mock()
+        service.ai_threat_detection.predict_email_threat_batch = AsyncMock(return_value=[None, None, None])
+        ok_result = Mock(action=EmailAction.ALLOW)
+        
+        async def process(email_data, ai_result=None):
+            if email_data["sender"] == "bad@example.com":
+                raise RuntimeError("boom")
+            return ok_result
+        
+        batch = [{"sender": sender} for sender in ("a@example.com", "bad@example.com", "c@example.com")]
+        with patch.object(service, "process_email", side_effect=process):
+            results = await service.process_email_batch(batch)
+        
+        assert results[0] is ok_result
+        assert results[2] is ok_result
+        assert results[1].action == EmailAction.QUARANTINE
+        assert results[1].threat_score == 1.0
+        assert "processing_error" in results[1].indicators
+    
+    @pytest.mark.asyncio
+    async def test_store_works_after_stop_and_start(self):
+        """Test that a stop/start cycle leaves the DB thread pool usable."""
+        service = EmailGatewayService({})
+        service.email_integrations = AsyncMock()
+        inserted = []
+        
+        with patch.object(service, "_process_email_queue", new=AsyncMock()), \
+                patch.object(service, "_report_statistics", new=AsyncMock()), \
+                patch.object(service, "_insert_emails", side_effect=inserted.extend):
+            await service.start()
+            await service.stop()
+            await service.start()
+            
+            future = asyncio.get_running_loop().create_future()
+            await service._run_store_batch([("record", [], future)])
+        
+        await future
+        assert inserted == [("record", [])]
+        await service.stop()